@@ -4,20 +4,29 @@ Handles conversation history, context generation, and OpenAI API calls
 """
 
 import os
-import json
-from datetime import datetime
+import orjson
+from datetime import datetime, timezone
 from openai import OpenAI
+from openai_http import http_client
 from pathlib import Path
 
 client = None
 
+# Only the most recent user/assistant pairs are sent to the model
+MAX_HISTORY_TURNS = int(os.getenv('MAX_HISTORY_TURNS', 20))
+
 def initialize_openai():
     """Initialize OpenAI client with API key from environment"""
     global client
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
         raise ValueError("OPENAI_API_KEY not found in environment variables")
-    client = OpenAI(api_key=api_key)
+    client = OpenAI(api_key=api_key, http_client=http_client)
+
+
+def utc_now_iso():
+    """Current UTC time as a timezone-aware ISO 8601 string"""
+    return datetime.now(timezone.utc).isoformat()
 
 
 def get_context_file_path(user_id):
@@ -27,33 +36,55 @@ def get_context_file_path(user_id):
     return context_dir / f"context_{user_id}.json"
 
 
+# user_id -> ((mtime_ns, size), file bytes). Keyed on the file's stat so a write
+# from any worker process invalidates the entry without explicit coordination.
+# The bytes are parsed per call so every caller gets its own dict to modify.
+_context_cache = {}
+
+
+def _file_stamp(stat_result):
+    return (stat_result.st_mtime_ns, stat_result.st_size)
+
+
 def load_context(user_id):
-    """Load conversation context for a user"""
+    """Load conversation context for a user (re-read only when the file has changed)"""
     context_file = get_context_file_path(user_id)
     
-    if context_file.exists():
+    try:
+        stamp = _file_stamp(context_file.stat())
+    except FileNotFoundError:
+        stamp = None
+    
+    if stamp is not None:
+        cached = _context_cache.get(user_id)
+        if cached is not None and cached[0] == stamp:
+            return orjson.loads(cached[1])
+        raw = context_file.read_bytes()
         try:
-            with open(context_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {"user_id": user_id, "context_history": [], "created_at": datetime.utcnow().isoformat()}
+            context = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return {"user_id": user_id, "context_history": [], "created_at": utc_now_iso()}
+        _context_cache[user_id] = (stamp, raw)
+        return context
     else:
+        now = utc_now_iso()
         context = {
             "user_id": user_id,
             "context_history": [],
-            "created_at": datetime.utcnow().isoformat()
+            "created_at": now
         }
-        save_context(user_id, context)
+        save_context(user_id, context, now)
         return context
 
 
-def save_context(user_id, context):
-    """Save conversation context for a user"""
+def save_context(user_id, context, timestamp=None):
+    """Save conversation context for a user; timestamp (ISO string) defaults to now"""
     context_file = get_context_file_path(user_id)
-    context["updated_at"] = datetime.utcnow().isoformat()
+    context["updated_at"] = timestamp or utc_now_iso()
     
-    with open(context_file, 'w', encoding='utf-8') as f:
-        json.dump(context, f, indent=2, ensure_ascii=False)
+    raw = orjson.dumps(context, option=orjson.OPT_INDENT_2)
+    context_file.write_bytes(raw)
+    _context_cache[user_id] = (_file_stamp(context_file.stat()), raw)
 
 
 def generate_context_summary(conversation_messages):
@@ -98,7 +129,7 @@ Provide only the bullet point summary, nothing else."""
         return summary
     
     except Exception as e:
-        return f"• Conversation on {datetime.timezone.utc.strftime('%Y-%m-%d %H:%M')}"
+        return f"• Conversation on {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M')}"
 
 def add_context_entry(user_id, conversation_messages):
     """
@@ -112,8 +143,9 @@ def add_context_entry(user_id, conversation_messages):
     
     summary = generate_context_summary(conversation_messages)
     
+    now = utc_now_iso()
     context_entry = {
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": now,
         "summary": summary
     }
     
@@ -122,7 +154,7 @@ def add_context_entry(user_id, conversation_messages):
     if len(context["context_history"]) > 20:
         context["context_history"] = context["context_history"][-20:]
     
-    save_context(user_id, context)
+    save_context(user_id, context, now)
     return context_entry
 
 
@@ -149,26 +181,11 @@ def format_context_for_prompt(user_id):
     return context_text
 
 
-def chat_with_ai(user_id, user_message, conversation_history=None, source=None, note_context=None):
+def build_chat_messages(user_id, user_message, conversation_history, source=None, note_context=None):
     """
-    Send a message to OpenAI and get a response, maintaining conversation context
-    
-    Args:
-        user_id: User ID
-        user_message: The user's message
-        conversation_history: Optional list of previous messages in this session
-        source: Optional context hint (e.g. "notes", "grades:assignment:X") for better responses
-        note_context: Optional current note content when chatting from Notes view
-    
-    Returns:
-        Dict containing the AI response and updated conversation history
+    Build the message list sent to OpenAI: system prompt with saved context,
+    the recent conversation window and the new user message
     """
-    if not client:
-        initialize_openai()
-    
-    if conversation_history is None:
-        conversation_history = []
-    
     context_prompt = format_context_for_prompt(user_id)
     
     source_hint = ""
@@ -189,9 +206,33 @@ assignments, and study plans. Be concise, friendly, and educational.
         }
     ]
     
-    messages.extend(conversation_history)
+    messages.extend(conversation_history[-2 * MAX_HISTORY_TURNS:])
     
     messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def chat_with_ai(user_id, user_message, conversation_history=None, source=None, note_context=None):
+    """
+    Send a message to OpenAI and get a response, maintaining conversation context
+    
+    Args:
+        user_id: User ID
+        user_message: The user's message
+        conversation_history: Optional list of previous messages in this session
+        source: Optional context hint (e.g. "notes", "grades:assignment:X") for better responses
+        note_context: Optional current note content when chatting from Notes view
+    
+    Returns:
+        Dict containing the AI response and updated conversation history
+    """
+    if not client:
+        initialize_openai()
+    
+    if conversation_history is None:
+        conversation_history = []
+    
+    messages = build_chat_messages(user_id, user_message, conversation_history, source, note_context)
     
     try:
         response = client.chat.completions.create(
@@ -216,6 +257,50 @@ assignments, and study plans. Be concise, friendly, and educational.
         raise Exception(f"OpenAI API error: {str(e)}")
 
 
+def stream_chat_with_ai(user_id, user_message, conversation_history=None, source=None, note_context=None):
+    """
+    Streaming variant of chat_with_ai
+    
+    Yields:
+        Each piece of the assistant's reply as it is generated
+    
+    Returns:
+        (via StopIteration.value) the updated conversation history
+    """
+    if not client:
+        initialize_openai()
+    
+    if conversation_history is None:
+        conversation_history = []
+    
+    messages = build_chat_messages(user_id, user_message, conversation_history, source, note_context)
+    
+    try:
+        stream = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=messages,
+            max_tokens=500,
+            temperature=0.7,
+            stream=True
+        )
+        
+        parts = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+    
+    except Exception as e:
+        raise Exception(f"OpenAI API error: {str(e)}")
+    
+    conversation_history.append({"role": "user", "content": user_message})
+    conversation_history.append({"role": "assistant", "content": "".join(parts)})
+    return conversation_history
+
+
 def end_conversation_session(user_id, conversation_history):
     """
     End a conversation session and save a summary to context
@@ -239,12 +324,13 @@ def clear_context(user_id):
     Args:
         user_id: User ID
     """
+    now = utc_now_iso()
     context = {
         "user_id": user_id,
         "context_history": [],
-        "created_at": datetime.utcnow().isoformat()
+        "created_at": now
     }
-    save_context(user_id, context)
+    save_context(user_id, context, now)
     return context
 
 
@@ -1,9 +1,9 @@
 # ai_notes.py
 
 import os
-import json
+import orjson
 from openai import OpenAI 
-import tempfile
+from openai_http import http_client
 from docx import Document
 from fpdf import FPDF
 from flask import send_file, jsonify
@@ -25,7 +25,7 @@ def initialize_openai():
     api_key = os.environ.get("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OPENAI_API_KEY not found in environment variables")
-    client = OpenAI(api_key=api_key)
+    client = OpenAI(api_key=api_key, http_client=http_client)
 
 
 def extract_text_from_note(note):
@@ -35,7 +35,7 @@ def extract_text_from_note(note):
     """
     try:
         logger.info(f"Extracting text from note ID={note.id}")
-        content_dict = json.loads(note.content) if isinstance(note.content, str) else (note.content or {})
+        content_dict = orjson.loads(note.content) if isinstance(note.content, str) else (note.content or {})
         text = content_dict.get("text", "")
         if not text:
             body = content_dict.get("body", "")
@@ -60,7 +60,7 @@ def generate_summary_and_questions(text):
     if not client:
         initialize_openai()
     
-    print(text)
+    logger.debug(f"Lecture text: {text[:200]}")
     if not text.strip():
         logger.warning("Empty lecture text received for AI generation")
         return "", ""
@@ -113,7 +113,8 @@ def generate_summary_and_questions(text):
 
 
 
-def export_note_as_docx(note, summary, questions):
+def export_note_as_docx(note, summary, questions, out):
+    """Write the note's summary and questions as a DOCX document to the binary stream out"""
     try:
         logger.info(f"Exporting note ID={note.id} as DOCX")
 
@@ -126,12 +127,10 @@ def export_note_as_docx(note, summary, questions):
         for line in questions.split("\n"):
             doc.add_paragraph(line, style='ListBullet')
 
-        temp = tempfile.NamedTemporaryFile(suffix='.docx', delete=False)
-        doc.save(temp.name)
-        temp.seek(0)
+        doc.save(out)
 
         logger.info("DOCX export successful")
-        return temp
+        return out
 
     except Exception:
         logger.exception("DOCX export failed")
@@ -139,7 +138,8 @@ def export_note_as_docx(note, summary, questions):
 
 
 
-def export_note_as_pdf(note, summary, questions):
+def export_note_as_pdf(note, summary, questions, out):
+    """Write the note's summary and questions as a PDF document to the binary stream out"""
     try:
         logger.info(f"Exporting note ID={note.id} as PDF")
 
@@ -153,12 +153,11 @@ def export_note_as_pdf(note, summary, questions):
         pdf.ln(5)
         pdf.multi_cell(0, 10, "Possible Exam Questions\n" + questions)
 
-        temp = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
-        pdf.output(temp.name)
-        temp.seek(0)
+        # FPDF 1.7 returns the document as a latin-1 str when dest='S'
+        out.write(pdf.output(dest='S').encode('latin-1'))
 
         logger.info("PDF export successful")
-        return temp
+        return out
 
     except Exception:
         logger.exception("PDF export failed")
@@ -12,6 +12,7 @@ from flask_restx import Namespace, Resource, fields
 from flask import request
 import os
 import openai_service as ai
+from sse import sse_event, sse_response
 
 ns_ai = Namespace('ai', description='AI Study-Plan Chatbot (StudyBot)')
 
@@ -65,6 +66,29 @@ def _get_or_create_session(user_id: int) -> list[dict[str, str]]:
     return _conversations[user_id]
 
 
+def _session_with_user_message() -> list[dict[str, str]]:
+    """Validate a chat request body and append its message to the user's session."""
+    data = request.get_json(force=True) or {}
+    user_id:      int  = data.get("user_id", 1)
+    user_message: str  = (data.get("message") or "").strip()
+    assignments:  list = data.get("assignments", [])
+
+    if not user_message:
+        ns_ai.abort(400, "message is required")
+
+    session = _get_or_create_session(user_id)
+
+    if len(session) == 1 and assignments:
+        context = ai.build_context_message(assignments, existing_plan=None)
+        session.append({
+            "role": "system",
+            "content": f"[Student context — use this to tailor the study plan]\n{context}"
+        })
+
+    session.append({"role": "user", "content": user_message})
+    return session
+
+
 @ns_ai.route('/chat')
 class AIChatResource(Resource):
     @ns_ai.doc('send_message')
@@ -72,24 +96,7 @@ class AIChatResource(Resource):
     @ns_ai.marshal_with(chat_output)
     def post(self):
         """Send a message to StudyBot and get a reply (+ optional generated plan)."""
-        data = request.get_json(force=True) or {}
-        user_id:      int  = data.get("user_id", 1)
-        user_message: str  = (data.get("message") or "").strip()
-        assignments:  list = data.get("assignments", [])
-
-        if not user_message:
-            ns_ai.abort(400, "message is required")
-
-        session = _get_or_create_session(user_id)
-
-        if len(session) == 1 and assignments:
-            context = ai.build_context_message(assignments, existing_plan=None)
-            session.append({
-                "role": "system",
-                "content": f"[Student context — use this to tailor the study plan]\n{context}"
-            })
-
-        session.append({"role": "user", "content": user_message})
+        session = _session_with_user_message()
 
         try:
             reply = ai.chat(session)
@@ -103,6 +110,35 @@ class AIChatResource(Resource):
         return {"reply": reply, "plan": plan}, 200
 
 
+@ns_ai.route('/chat/stream')
+class AIChatStreamResource(Resource):
+    @ns_ai.doc('stream_message', produces=['text/event-stream'])
+    @ns_ai.expect(chat_input)
+    def post(self):
+        """
+        Send a message to StudyBot and stream the reply as Server-Sent Events.
+        Emits {"delta": ...} events, then {"done": true, "plan": ...} or {"error": ...}.
+        """
+        session = _session_with_user_message()
+
+        def generate():
+            parts = []
+            try:
+                for delta in ai.chat_stream(session):
+                    parts.append(delta)
+                    yield sse_event({"delta": delta})
+            except Exception as exc:
+                session.pop()
+                yield sse_event({"error": str(exc)})
+                return
+
+            reply = "".join(parts)
+            session.append({"role": "assistant", "content": reply})
+            yield sse_event({"done": True, "plan": ai.extract_json_plan(reply)})
+
+        return sse_response(generate())
+
+
 @ns_ai.route('/chat/history')
 class AIChatHistoryResource(Resource):
     @ns_ai.doc('get_history')
@@ -167,6 +203,8 @@ class AIGeneratePlanResource(Resource):
         try:
             plan = ai.generate_study_plan_json(modules, deadlines, preferences, timezone)
             return plan, 200
+        except ValueError as exc:
+            ns_ai.abort(400, str(exc))
         except Exception as exc:
             ns_ai.abort(500, str(exc))
 
@@ -1,14 +1,40 @@
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Response, request, send_file, jsonify, make_response, g, current_app, abort
+from flask.json.provider import JSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from flask_restx import Api, Resource as RestxResource, fields, Namespace
+from flask_restx.fields import get_value
+from flask_restx.marshalling import marshal_with
+from flask_restx.utils import unpack
 from flask_cors import CORS
-from datetime import datetime, timedelta
+from flask_caching import Cache
+from flask_caching.backends import NullCache, SimpleCache
+from sqlalchemy import event, lambda_stmt
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta, timezone
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from io import BytesIO
+from itertools import chain
 from werkzeug.utils import secure_filename
-import json
+from pydantic import BaseModel, ValidationError
 import os
 import logging
+import time
 import uuid
 import mimetypes
+import calendar
+import hashlib
+import sqlite3
+import threading
+import orjson
+
+try:
+    from ciso8601 import parse_datetime as _parse_iso_datetime
+except ImportError:
+    _parse_iso_datetime = None
 
 from dotenv import load_dotenv
 # from azure.identity import DefaultAzureCredential
@@ -23,6 +49,7 @@ from dotenv import load_dotenv
 # MICROSOFT_TENANT_ID = client.get_secret("MICROSOFT-TENANT-ID").value
 
 from microsoft_routes import register_microsoft_routes
+from sse import sse_event, sse_response
 from ai_notes import (
     extract_text_from_note,
     generate_summary_and_questions,
@@ -32,6 +59,7 @@ from ai_notes import (
 from ai_chat import (
     initialize_openai,
     chat_with_ai,
+    stream_chat_with_ai,
     end_conversation_session,
     load_context,
     clear_context,
@@ -49,16 +77,32 @@ logger = logging.getLogger(__name__)
 try:
     initialize_openai()
 except Exception as e:
-    print(f"Warning: Could not initialize OpenAI: {e}")
+    logger.warning(f"Could not initialize OpenAI: {e}")
 
-app = Flask(__name__)
+def orjson_dumps(obj):
+    """Encode obj to a JSON string with orjson"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson_dumps(obj)
 
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 CORS(app, resources={
     r"/api/*": {
         "origins": ["http://localhost:5173", "http://localhost:3000"],
         "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["X-Next-Cursor"],
         "supports_credentials": True
     }
 })
@@ -66,8 +110,23 @@ CORS(app, resources={
 basedir = os.path.abspath(os.path.dirname(__file__))
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'study_app.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'json_serializer': orjson_dumps,
+    'json_deserializer': orjson.loads,
+    # Room for every distinct statement the API issues, so none get evicted and recompiled
+    'query_cache_size': 1200,
+    # Enough pooled connections for every gunicorn thread (see gunicorn_conf.py) plus
+    # bursts. SQLite connections are local files, so pre-ping/recycle would only add work.
+    'pool_size': 10,
+    'max_overflow': 20
+}
 app.config['JSON_SORT_KEYS'] = False
 app.config['RESTX_MASK_SWAGGER'] = False
+# SimpleCache is per process. Set CACHE_TYPE=RedisCache (with CACHE_REDIS_URL) to
+# share the cached tag and course lists across gunicorn workers.
+app.config['CACHE_TYPE'] = os.getenv('CACHE_TYPE', 'SimpleCache')
+app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+app.config['CACHE_DEFAULT_TIMEOUT'] = 300
 
 RESOURCES_FOLDER = os.path.join(os.path.dirname(basedir), 'resources')
 os.makedirs(RESOURCES_FOLDER, exist_ok=True)
@@ -84,6 +143,12 @@ ALLOWED_EXTENSIONS = {
     'zip': 'archive', 'rar': 'archive', '7z': 'archive', 'tar': 'archive', 'gz': 'archive'
 }
 
+# Days until the next review after the 1st, 2nd, ... revision
+SPACED_REP_INTERVALS = (1, 3, 7, 14, 30, 60, 90)
+
+# Upper bound for ?limit= on paginated list endpoints
+MAX_PAGE_SIZE = 200
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -95,6 +160,54 @@ def get_file_type(filename):
         return ALLOWED_EXTENSIONS.get(ext, 'other')
     return 'other'
 
+# os.remove releases the GIL, so many uploads can be unlinked concurrently
+_file_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='file-remove')
+
+def _safe_remove(file_path):
+    """Remove a file if it exists; returns the OSError instead of raising"""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        return e
+    return None
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+def save_upload(file, file_path):
+    """Write an uploaded file to disk in chunks and return its size in bytes"""
+    size = 0
+    with open(file_path, 'wb') as out:
+        while chunk := file.stream.read(UPLOAD_CHUNK_SIZE):
+            out.write(chunk)
+            size += len(chunk)
+    return size
+
+def remove_files(file_paths):
+    """Remove files in parallel; returns (file_path, error) pairs for failures"""
+    results = _file_pool.map(_safe_remove, file_paths)
+    return [(file_path, e) for file_path, e in zip(file_paths, results) if e is not None]
+
+# OpenAI calls are slow network I/O; a separate bounded pool caps how many run at once
+AI_WORKERS = int(os.getenv('AI_WORKERS', 16))
+AI_CALL_TIMEOUT = 60
+_ai_pool = ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix='ai')
+
+def run_ai_call(fn, *args, **kwargs):
+    """Run a blocking AI call on the AI pool; raises TimeoutError after AI_CALL_TIMEOUT seconds"""
+    return _ai_pool.submit(fn, *args, **kwargs).result(timeout=AI_CALL_TIMEOUT)
+
+def parse_iso_datetime(value):
+    """Parse an ISO 8601 timestamp (trailing Z allowed), using ciso8601 when installed"""
+    if _parse_iso_datetime is not None:
+        return _parse_iso_datetime(value)
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def now_iso():
+    """Current UTC time as an ISO 8601 string with offset, to the second, for response timestamps"""
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
 api = Api(
     app,
     version='1.0',
@@ -103,9 +216,32 @@ api = Api(
     doc='/api/docs' 
 )
 
+
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    """Serialize RESTX responses with orjson instead of the stdlib encoder"""
+    resp = make_response(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE), code)
+    resp.headers.extend(headers or {})
+    return resp
+
 db = SQLAlchemy(app)
+cache = Cache(app)
 register_microsoft_routes(api)
 
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Enable WAL and relaxed fsync on every new SQLite connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
 class User(db.Model):
     """User table storing Microsoft authentication data"""
     __tablename__ = 'users'
@@ -117,11 +253,11 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, default=datetime.utcnow)
     
-    notes = db.relationship('Note', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    notes = db.relationship('Note', backref='user', lazy='select', cascade='all, delete-orphan')
     study_plan = db.relationship('StudyPlan', backref='user', uselist=False, cascade='all, delete-orphan')
-    spaced_repetitions = db.relationship('SpacedRepetition', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    assignments = db.relationship('Assignment', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    tags = db.relationship('Tag', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    spaced_repetitions = db.relationship('SpacedRepetition', backref='user', lazy='select', cascade='all, delete-orphan')
+    assignments = db.relationship('Assignment', backref='user', lazy='select', cascade='all, delete-orphan')
+    tags = db.relationship('Tag', backref='user', lazy='select', cascade='all, delete-orphan')
     
     def to_dict(self):
         return {
@@ -137,34 +273,64 @@ class User(db.Model):
 class Note(db.Model):
     """Notes table with JSON content and metadata"""
     __tablename__ = 'notes'
+    # Lets the subject LIKE filter in UserNoteList.get be checked against index
+    # entries for the user instead of reading every note row.
+    __table_args__ = (
+        db.Index('ix_notes_user_subject', 'user_id', 'subject'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
-    content = db.Column(db.Text, nullable=False)
+    content = db.Column(db.JSON, nullable=False)
     subject = db.Column(db.String(255))
-    tags = db.Column(db.Text)
+    tags = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    @property
+    def tags_list(self):
+        """Tags as a list (the JSON column is decoded by SQLAlchemy on load)"""
+        return self.tags or []
+    
     def to_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
-            'content': json.loads(self.content) if self.content else {},
+            'content': self.content or {},
             'subject': self.subject,
-            'tags': json.loads(self.tags) if self.tags else [],
+            'tags': self.tags_list,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 
+# Columns projected by list endpoints, which build note_output dicts straight
+# from result rows instead of materializing Note instances.
+NOTE_OUTPUT_COLUMNS = (
+    Note.id, Note.user_id, Note.content, Note.subject,
+    Note.tags, Note.created_at, Note.updated_at
+)
+
+
+def note_row_to_dict(row):
+    return {
+        'id': row.id,
+        'user_id': row.user_id,
+        'content': row.content or {},
+        'subject': row.subject,
+        'tags': row.tags or [],
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'updated_at': row.updated_at.isoformat() if row.updated_at else None
+    }
+
+
 class StudyPlan(db.Model):
     """Study plan table - one per user, contains monthly schedule"""
     __tablename__ = 'study_plans'
     
     plan_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True, index=True)
-    study_plan = db.Column(db.Text, nullable=False)
+    study_plan = db.Column(db.JSON, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -172,7 +338,7 @@ class StudyPlan(db.Model):
         return {
             'plan_id': self.plan_id,
             'user_id': self.user_id,
-            'study_plan': json.loads(self.study_plan) if self.study_plan else {},
+            'study_plan': self.study_plan or {},
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -181,32 +347,66 @@ class StudyPlan(db.Model):
 class SpacedRepetition(db.Model):
     """Spaced repetition tracking for notes"""
     __tablename__ = 'spaced_repetitions'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'note_id', name='uq_spaced_repetitions_user_note'),
+        # Serves per-user review queues ordered by due date and the heatmap
+        # signature's max(next_review_date) straight from the index.
+        db.Index('ix_spaced_repetitions_user_next_review', 'user_id', 'next_review_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     note_id = db.Column(db.Integer, db.ForeignKey('notes.id'), nullable=False, index=True)
-    repetition_dates = db.Column(db.Text)
+    repetition_dates = db.Column(db.JSON)
     revision_count = db.Column(db.Integer, default=0)
-    next_review_date = db.Column(db.DateTime, index=True)
+    next_review_date = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     note = db.relationship('Note', backref='spaced_repetitions')
     
+    @property
+    def repetition_dates_list(self):
+        """Review timestamps as a list (the JSON column is decoded by SQLAlchemy on load)"""
+        return self.repetition_dates or []
+    
     def to_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
             'note_id': self.note_id,
-            'repetition_dates': json.loads(self.repetition_dates) if self.repetition_dates else [],
+            'repetition_dates': self.repetition_dates_list,
             'revision_count': self.revision_count,
             'next_review_date': self.next_review_date.isoformat() if self.next_review_date else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 
+SPACED_REP_OUTPUT_COLUMNS = (
+    SpacedRepetition.id, SpacedRepetition.user_id, SpacedRepetition.note_id,
+    SpacedRepetition.repetition_dates, SpacedRepetition.revision_count,
+    SpacedRepetition.next_review_date, SpacedRepetition.created_at
+)
+
+
+def spaced_rep_row_to_dict(row):
+    return {
+        'id': row.id,
+        'user_id': row.user_id,
+        'note_id': row.note_id,
+        'repetition_dates': row.repetition_dates or [],
+        'revision_count': row.revision_count,
+        'next_review_date': row.next_review_date.isoformat() if row.next_review_date else None,
+        'created_at': row.created_at.isoformat() if row.created_at else None
+    }
+
+
 class Assignment(db.Model):
     """Assignments table with due dates, tags, grades, and weights"""
     __tablename__ = 'assignments'
+    __table_args__ = (
+        # Serves the per-user due-date filters and the (due_date_ts, id) keyset order
+        db.Index('ix_assignments_user_due_date_ts', 'user_id', 'due_date_ts', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -214,13 +414,30 @@ class Assignment(db.Model):
 
     name = db.Column(db.String(255), nullable=False)
     due_date = db.Column(db.DateTime, nullable=False, index=True)
-
-    tags = db.Column(db.Text)
+    due_date_ts = db.Column(db.BigInteger, index=True)  # due_date as UTC epoch seconds
 
     grade = db.Column(db.Float)
     weight = db.Column(db.Float, nullable=False, default=0)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    tag_objects = db.relationship(
+        'Tag',
+        secondary='assignment_tags',
+        lazy='selectin',
+        order_by='Tag.name',
+        backref=db.backref('assignments', lazy='select')
+    )
+
+    @property
+    def tags(self):
+        """Tag names, ordered by name"""
+        return [tag.name for tag in self.tag_objects]
+
+    @property
+    def tags_list(self):
+        return self.tags
 
     def to_dict(self):
         return {
@@ -229,13 +446,24 @@ class Assignment(db.Model):
             "canvas_id": self.canvas_id,
             "name": self.name,
             "due_date": self.due_date.isoformat() if self.due_date else None,
-            "tags": json.loads(self.tags) if self.tags else [],
+            "tags": self.tags_list,
             "grade": self.grade,
             "weight": self.weight,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
 
 
+def to_utc_timestamp(dt):
+    """Convert a datetime to UTC epoch seconds (naive values are treated as UTC)"""
+    return calendar.timegm(dt.utctimetuple())
+
+
+@event.listens_for(Assignment, 'before_insert')
+@event.listens_for(Assignment, 'before_update')
+def set_assignment_due_date_ts(mapper, connection, target):
+    target.due_date_ts = to_utc_timestamp(target.due_date) if target.due_date else None
+
+
 class Tag(db.Model):
     """Tags table - tracks all valid tags created from assignments"""
     __tablename__ = 'tags'
@@ -262,6 +490,13 @@ class Tag(db.Model):
         }
 
 
+assignment_tags = db.Table(
+    'assignment_tags',
+    db.Column('assignment_id', db.Integer, db.ForeignKey('assignments.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True, index=True)
+)
+
+
 class Course(db.Model):
     """Courses table - stores professor courses for organizing resources"""
     __tablename__ = 'courses'
@@ -292,7 +527,7 @@ class Course(db.Model):
             "description": self.description,
             "student_count": self.student_count,
             "total_weeks": self.total_weeks,
-            "resource_count": self.resources.count() if self.resources else 0,
+            "resource_count": self.resource_count or 0,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
@@ -301,6 +536,11 @@ class Course(db.Model):
 class Resource(db.Model):
     """Resources table - stores lecture materials (PDFs, videos, documents, etc.)"""
     __tablename__ = 'resources'
+    __table_args__ = (
+        # ResourceList.get orders by created_at DESC; SQLite walks the index backwards.
+        db.Index('ix_resources_user_created_at', 'user_id', 'created_at'),
+        db.Index('ix_resources_user_course_week', 'user_id', 'course_id', 'week_number'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -354,15 +594,102 @@ class Resource(db.Model):
         return f"{size:.1f} TB"
 
 
-ns_users = Namespace('users', description='User operations')
-ns_notes = Namespace('notes', description='Note operations')
-ns_study_plans = Namespace('study-plans', description='Study plan operations')
-ns_spaced_reps = Namespace('spaced-repetitions', description='Spaced repetition operations')
-ns_assignments = Namespace('assignments', description='Assignment operations')
-ns_tags = Namespace('tags', description='Tag operations')
-ns_resources = Namespace('resources', description='Resource/lecture material operations')
-ns_courses = Namespace('courses', description='Course operations')
-ns_chat = Namespace('chat', description='AI Chat operations with context management')
+Course.resource_count = db.column_property(
+    db.select(db.func.count(Resource.id))
+    .where(Resource.course_id == Course.id)
+    .correlate_except(Resource)
+    .scalar_subquery()
+)
+
+
+def _str_or_none(value):
+    return None if value is None else str(value)
+
+
+def generate_marshaller(compiled):
+    """
+    Build a function that marshals one object with a single dict literal.
+    Plain Raw/String fields (no attribute, default or mask) are inlined as a
+    get_value lookup, which is all their output() does; other fields keep
+    calling output().
+    """
+    items = []
+    for index, (key, field) in enumerate(compiled):
+        plain = field.attribute is None and not field.default and not field.mask
+        if plain and type(field) is fields.Raw:
+            items.append(f'{key!r}: _get({key!r}, obj)')
+        elif plain and type(field) is fields.String and not field.discriminator:
+            items.append(f'{key!r}: _str(_get({key!r}, obj))')
+        else:
+            items.append(f'{key!r}: _fields[{index}].output({key!r}, obj)')
+    source = 'def marshal_one(obj):\n    return {' + ', '.join(items) + '}\n'
+    namespace = {'_get': get_value, '_str': _str_or_none, '_fields': [field for _, field in compiled]}
+    exec(compile(source, '<generated marshaller>', 'exec'), namespace)
+    return namespace['marshal_one']
+
+
+class compiled_marshal_with(marshal_with):
+    """
+    marshal_with that flattens the model into (key, field) pairs once, at
+    decoration time, and generates a specialized marshaller from them.
+    Requests with an X-Fields mask, and envelope/skip_none/ordered options, use
+    the stock Flask-RESTX path.
+    """
+
+    def __init__(self, fields, **kwargs):
+        super().__init__(fields, **kwargs)
+        resolved = getattr(fields, 'resolved', fields)
+        self.compiled = tuple(
+            (key, field() if isinstance(field, type) else field)
+            for key, field in resolved.items()
+        )
+        self.marshal_one = generate_marshaller(self.compiled)
+        self.fast_path = not (self.envelope or self.skip_none or self.ordered)
+
+    def marshal(self, data):
+        if isinstance(data, (list, tuple)):
+            return [self.marshal_one(item) for item in data]
+        return self.marshal_one(data)
+
+    def __call__(self, f):
+        stock_wrapper = super().__call__(f)
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not self.fast_path or request.headers.get(current_app.config['RESTX_MASK_HEADER']):
+                return stock_wrapper(*args, **kwargs)
+            resp = f(*args, **kwargs)
+            if isinstance(resp, tuple):
+                data, code, headers = unpack(resp)
+                return self.marshal(data), code, headers
+            return self.marshal(resp)
+
+        return wrapper
+
+
+class CompiledNamespace(Namespace):
+    """Namespace whose marshal_with/marshal_list_with use compiled_marshal_with"""
+
+    def marshal_with(self, fields, as_list=False, code=200, description=None, **kwargs):
+        document = super().marshal_with(fields, as_list, code, description, **kwargs)
+
+        def wrapper(func):
+            # Only keep the Swagger documentation from the stock decorator.
+            document(func)
+            return compiled_marshal_with(fields, ordered=self.ordered, **kwargs)(func)
+
+        return wrapper
+
+
+ns_users = CompiledNamespace('users', description='User operations')
+ns_notes = CompiledNamespace('notes', description='Note operations')
+ns_study_plans = CompiledNamespace('study-plans', description='Study plan operations')
+ns_spaced_reps = CompiledNamespace('spaced-repetitions', description='Spaced repetition operations')
+ns_assignments = CompiledNamespace('assignments', description='Assignment operations')
+ns_tags = CompiledNamespace('tags', description='Tag operations')
+ns_resources = CompiledNamespace('resources', description='Resource/lecture material operations')
+ns_courses = CompiledNamespace('courses', description='Course operations')
+ns_chat = CompiledNamespace('chat', description='AI Chat operations with context management')
 
 
 api.add_namespace(ns_users, path='/api/users')
@@ -391,12 +718,25 @@ user_output = api.model('User', {
     'last_login': fields.String(description='Last login timestamp')
 })
 
+user_batch_input = api.model('UserBatchInput', {
+    'users': fields.List(fields.Nested(user_input), required=True, description='Users to create')
+})
+
+user_batch_output = api.model('UserBatchResult', {
+    'created': fields.List(fields.Nested(user_output), description='Users that were created'),
+    'skipped': fields.List(fields.String, description='microsoft_ids that already existed')
+})
+
 note_input = api.model('NoteInput', {
     'content': fields.Raw(required=True, description='Note content (JSON object)'),
     'subject': fields.String(description='Note subject'),
     'tags': fields.List(fields.String, description='Tags')
 })
 
+note_batch_input = api.model('NoteBatchInput', {
+    'notes': fields.List(fields.Nested(note_input), required=True, description='Notes to create')
+})
+
 note_output = api.model('Note', {
     'id': fields.Integer(description='Note ID'),
     'user_id': fields.Integer(description='User ID'),
@@ -431,16 +771,20 @@ assignment_input = api.model('AssignmentInput', {
     'weight': fields.Float(required=True, description='Weight percentage of assignment')
 })
 
+assignment_batch_input = api.model('AssignmentBatchInput', {
+    'assignments': fields.List(fields.Nested(assignment_input), required=True, description='Assignments to create')
+})
+
 assignment_output = api.model('Assignment', {
     'id': fields.Integer(description='Assignment ID'),
     'user_id': fields.Integer(description='User ID'),
     'name': fields.String(description='Name'),
-    'due_date': fields.String(description='Due date'),
-    'tags': fields.List(fields.String, description='Tags'),
+    'due_date': fields.DateTime(dt_format='iso8601', description='Due date'),
+    'tags': fields.List(fields.String, default=[], description='Tags'),
     'grade': fields.Float(description='Grade received'),
     'weight': fields.Float(description='Weight percentage'),
 
-    'created_at': fields.String(description='Creation timestamp')
+    'created_at': fields.DateTime(dt_format='iso8601', description='Creation timestamp')
 })
 
 
@@ -448,6 +792,10 @@ spaced_rep_input = api.model('SpacedRepInput', {
     'note_id': fields.Integer(required=True, description='Note ID to add to spaced repetition')
 })
 
+spaced_rep_bulk_input = api.model('SpacedRepBulkInput', {
+    'note_ids': fields.List(fields.Integer, required=True, description='Note IDs to add to spaced repetition (at most 200)')
+})
+
 spaced_rep_output = api.model('SpacedRepetition', {
     'id': fields.Integer(description='Spaced repetition ID'),
     'user_id': fields.Integer(description='User ID'),
@@ -540,6 +888,30 @@ chat_session_end_input = api.model('ChatSessionEndInput', {
     'conversation_history': fields.Raw(required=True, description='Full conversation history to summarize')
 })
 
+
+# Request bodies for the chat endpoints, parsed and validated in one pass by
+# pydantic; the RESTX models above document them in Swagger.
+class ChatMessageBody(BaseModel):
+    message: str
+    conversation_history: list[dict] | None = None
+    source: str | None = None
+    note_context: str | None = None
+
+
+class ChatSessionEndBody(BaseModel):
+    conversation_history: list[dict]
+
+
+def parse_json_body(model):
+    """Parse the raw request body into a pydantic model, aborting with 400 on invalid input"""
+    try:
+        return model.model_validate_json(request.get_data())
+    except ValidationError as e:
+        api.abort(400, '; '.join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'body'}: {error['msg']}"
+            for error in e.errors()
+        ))
+
 context_output = api.model('Context', {
     'user_id': fields.Integer(description='User ID'),
     'context_history': fields.Raw(description='List of context summaries'),
@@ -557,6 +929,58 @@ context_stats_output = api.model('ContextStats', {
 })
 
 
+def conditional_get(signature):
+    """
+    Decorator adding ETag / If-None-Match support to a GET handler.
+    signature(**view_args) must cheaply return a value that changes whenever
+    the response would; a matching If-None-Match short-circuits to 304
+    before the handler runs.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            sig = (f.__qualname__, signature(**kwargs), sorted(request.args.items(multi=True)))
+            etag = hashlib.sha1(repr(sig).encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag, weak=True)
+                return response
+
+            data, code, headers = unpack(f(*args, **kwargs))
+            if code == 200:
+                headers = dict(headers or {})
+                headers['ETag'] = f'W/"{etag}"'
+            return data, code, headers
+        return wrapper
+    return decorator
+
+
+def user_notes_signature(user_id):
+    return tuple(db.session.query(
+        db.func.count(Note.id), db.func.max(Note.updated_at)
+    ).filter(Note.user_id == user_id).one())
+
+
+def note_signature(note_id):
+    return db.session.query(Note.updated_at).filter_by(id=note_id).scalar()
+
+
+def study_plan_signature(user_id):
+    return db.session.query(StudyPlan.updated_at).filter_by(user_id=user_id).scalar()
+
+
+def heatmap_signature(user_id):
+    cache = request_cache('_heatmap_signature')
+    if user_id not in cache:
+        cache[user_id] = (datetime.utcnow().year,) + tuple(db.session.query(
+            db.func.count(SpacedRepetition.id),
+            db.func.sum(SpacedRepetition.revision_count),
+            db.func.max(SpacedRepetition.next_review_date)
+        ).filter(SpacedRepetition.user_id == user_id).one())
+    return cache[user_id]
+
+
 @ns_users.route('')
 class UserList(RestxResource):
     @ns_users.doc('create_user')
@@ -569,8 +993,10 @@ class UserList(RestxResource):
         if not data or 'microsoft_id' not in data or 'email' not in data:
             api.abort(400, 'microsoft_id and email are required')
         
-        existing_user = User.query.filter_by(microsoft_id=data['microsoft_id']).first()
-        if existing_user:
+        user_exists = db.session.query(User.id).filter_by(
+            microsoft_id=data['microsoft_id']
+        ).scalar() is not None
+        if user_exists:
             api.abort(409, 'User already exists')
         
         user = User(
@@ -585,6 +1011,51 @@ class UserList(RestxResource):
         return user.to_dict(), 201
 
 
+@ns_users.route('/batch')
+class UserBatch(RestxResource):
+    @ns_users.doc('create_users_batch')
+    @ns_users.expect(user_batch_input)
+    @ns_users.marshal_with(user_batch_output, code=201)
+    def post(self):
+        """
+        Create several users in one request. Users whose microsoft_id or email already exist are skipped.
+        A microsoft_id repeated within the request is rejected with 400.
+        """
+        data = request.json
+        
+        if not data or not isinstance(data.get('users'), list):
+            api.abort(400, 'users is required')
+        
+        rows = []
+        seen_ids = set()
+        for index, item in enumerate(data['users']):
+            if not isinstance(item, dict) or 'microsoft_id' not in item or 'email' not in item:
+                api.abort(400, f'users[{index}]: microsoft_id and email are required')
+            # A repeat would be dropped by ON CONFLICT yet look created via the first row
+            if item['microsoft_id'] in seen_ids:
+                api.abort(400, f'users[{index}]: duplicate microsoft_id {item["microsoft_id"]}')
+            seen_ids.add(item['microsoft_id'])
+            rows.append({
+                'microsoft_id': item['microsoft_id'],
+                'email': item['email'],
+                'display_name': item.get('display_name', '')
+            })
+        
+        created = []
+        if rows:
+            # One INSERT for the whole batch; rows hitting a unique microsoft_id/email are skipped
+            created = db.session.scalars(
+                sqlite_insert(User).values(rows).on_conflict_do_nothing().returning(User)
+            ).all()
+            db.session.commit()
+        
+        created_ids = {user.microsoft_id for user in created}
+        return {
+            'created': [user.to_dict() for user in created],
+            'skipped': [row['microsoft_id'] for row in rows if row['microsoft_id'] not in created_ids]
+        }, 201
+
+
 @ns_users.route('/<int:user_id>')
 @ns_users.param('user_id', 'The user identifier')
 class UserResource(RestxResource):
@@ -614,35 +1085,38 @@ class UserResource(RestxResource):
 @ns_users.route('/<int:user_id>/notes')
 @ns_users.param('user_id', 'The user identifier')
 class UserNoteList(RestxResource):
+    @conditional_get(user_notes_signature)
     @ns_users.doc('get_user_notes')
     @ns_users.marshal_list_with(note_output)
     @ns_users.param('subject', 'Filter by subject')
     @ns_users.param('tag', 'Filter by tag')
+    @ns_users.param('limit', 'Page size (newest first); omit to return every note', type=int)
+    @ns_users.param('after_id', 'X-Next-Cursor value from the previous page', type=int)
     def get(self, user_id):
         """Get all notes for a user"""
-        user = User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         
         subject = request.args.get('subject') 
         tag = request.args.get('tag')
         
-        query = user.notes
+        query = Note.query.filter_by(user_id=user_id)
         
         if subject:
             query = query.filter(Note.subject.like(f'%{subject}%'))
         
-        notes = query.all()
-        
         if tag:
-            notes = [n for n in notes if tag in json.loads(n.tags)]
+            query = query.filter(note_has_tag(tag))
+        
+        rows, headers = keyset_paginate(query.with_entities(*NOTE_OUTPUT_COLUMNS), Note.id)
         
-        return [note.to_dict() for note in notes]
+        return [note_row_to_dict(row) for row in rows], 200, headers
     
     @ns_users.doc('create_note')
     @ns_users.expect(note_input)
     @ns_users.marshal_with(note_output, code=201)
     def post(self, user_id):
         """Create a new note for a user. Tags must exist from assignments."""
-        user = User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         data = request.json
         
         if not data or 'content' not in data:
@@ -660,9 +1134,9 @@ class UserNoteList(RestxResource):
         
         note = Note(
             user_id=user_id,
-            content=json.dumps(data['content']),
+            content=data['content'],
             subject=data.get('subject', ''),
-            tags=json.dumps(tags_to_save)
+            tags=tags_to_save
         )
         
         db.session.add(note)
@@ -671,9 +1145,46 @@ class UserNoteList(RestxResource):
         return note.to_dict(), 201
 
 
+@ns_users.route('/<int:user_id>/notes/batch')
+@ns_users.param('user_id', 'The user identifier')
+class UserNoteBatch(RestxResource):
+    @ns_users.doc('create_notes_batch')
+    @ns_users.expect(note_batch_input)
+    @ns_users.marshal_list_with(note_output, code=201)
+    def post(self, user_id):
+        """
+        Create several notes for a user in one request (JSON or application/x-ndjson).
+        All or none are created; tags must exist from assignments.
+        """
+        ensure_user_exists(user_id)
+        
+        notes = []
+        for index, item in enumerate(batch_items('notes')):
+            if not isinstance(item, dict) or 'content' not in item:
+                api.abort(400, f'notes[{index}]: content is required')
+            
+            valid_tags, invalid_tags = validate_note_tags(user_id, item.get('tags') or [])
+            if invalid_tags:
+                valid_tag_names = get_valid_tags_for_user(user_id)
+                api.abort(400, f'notes[{index}]: Invalid tags: {invalid_tags}. Tags must be created from assignments first. Valid tags: {valid_tag_names}')
+            
+            notes.append(Note(
+                user_id=user_id,
+                content=item['content'],
+                subject=item.get('subject', ''),
+                tags=valid_tags
+            ))
+        
+        db.session.add_all(notes)
+        db.session.commit()
+        
+        return [note.to_dict() for note in notes], 201
+
+
 @ns_notes.route('/<int:note_id>')
 @ns_notes.param('note_id', 'The note identifier')
 class NoteResource(RestxResource):
+    @conditional_get(note_signature)
     @ns_notes.doc('get_note')
     @ns_notes.marshal_with(note_output)
     def get(self, note_id):
@@ -690,7 +1201,7 @@ class NoteResource(RestxResource):
         data = request.json
         
         if 'content' in data:
-            note.content = json.dumps(data['content'])
+            note.content = data['content']
         if 'subject' in data:
             note.subject = data['subject']
         if 'tags' in data:
@@ -700,9 +1211,9 @@ class NoteResource(RestxResource):
                 if invalid_tags:
                     valid_tag_names = get_valid_tags_for_user(note.user_id)
                     api.abort(400, f'Invalid tags: {invalid_tags}. Tags must be created from assignments first. Valid tags: {valid_tag_names}')
-                note.tags = json.dumps(valid_tags)
+                note.tags = valid_tags
             else:
-                note.tags = json.dumps([])
+                note.tags = []
         
         note.updated_at = datetime.utcnow()
         db.session.commit()
@@ -723,11 +1234,12 @@ class NoteResource(RestxResource):
 @ns_study_plans.route('/user/<int:user_id>')
 @ns_study_plans.param('user_id', 'The user identifier')
 class StudyPlanResource(RestxResource):
+    @conditional_get(study_plan_signature)
     @ns_study_plans.doc('get_study_plan')
     @ns_study_plans.marshal_with(study_plan_output)
     def get(self, user_id):
         """Get study plan for a user"""
-        user = User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         study_plan = StudyPlan.query.filter_by(user_id=user_id).first()
         
         if not study_plan:
@@ -740,27 +1252,18 @@ class StudyPlanResource(RestxResource):
     @ns_study_plans.marshal_with(study_plan_output)
     def post(self, user_id):
         """Create or update study plan for a user"""
-        user = User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         data = request.json
         
         if not data or 'study_plan' not in data:
             api.abort(400, 'study_plan is required')
         
-        existing_plan = StudyPlan.query.filter_by(user_id=user_id).first()
+        study_plan, created = upsert_study_plan(user_id, data['study_plan'])
+        db.session.commit()
         
-        if existing_plan:
-            existing_plan.study_plan = json.dumps(data['study_plan'])
-            existing_plan.updated_at = datetime.utcnow()
-            db.session.commit()
-            return existing_plan.to_dict()
-        else:
-            study_plan = StudyPlan(
-                user_id=user_id,
-                study_plan=json.dumps(data['study_plan'])
-            )
-            db.session.add(study_plan)
-            db.session.commit()
+        if created:
             return study_plan.to_dict(), 201
+        return study_plan.to_dict()
 
 
 @ns_study_plans.route('/user/<int:user_id>/generate')
@@ -771,37 +1274,17 @@ class GenerateStudyPlan(RestxResource):
     @ns_study_plans.marshal_with(study_plan_output)
     def post(self, user_id):
         """Generate a monthly study plan prioritizing assignments"""
-        user = User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         data = request.json
         
         start_date_str = data.get('start_date', datetime.now().strftime('%Y-%m-%d'))
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
         
-        notes = Note.query.filter_by(user_id=user_id).all()
-        assignments = Assignment.query.filter_by(user_id=user_id).filter(
-            Assignment.due_date >= start_date
-        ).all()
-        
-        monthly_plan = generate_monthly_plan_logic(
-            start_date=start_date,
-            notes=notes,
-            assignments=assignments
-        )
-        
-        existing_plan = StudyPlan.query.filter_by(user_id=user_id).first()
-        
-        if existing_plan:
-            existing_plan.study_plan = json.dumps(monthly_plan)
-            existing_plan.updated_at = datetime.utcnow()
-        else:
-            existing_plan = StudyPlan(
-                user_id=user_id,
-                study_plan=json.dumps(monthly_plan)
-            )
-            db.session.add(existing_plan)
+        monthly_plan = get_cached_monthly_plan(user_id, start_date)
         
+        study_plan, _ = upsert_study_plan(user_id, monthly_plan)
         db.session.commit()
-        return existing_plan.to_dict()
+        return study_plan.to_dict()
 
 
 @ns_spaced_reps.route('/user/<int:user_id>')
@@ -809,50 +1292,111 @@ class GenerateStudyPlan(RestxResource):
 class SpacedRepList(RestxResource):
     @ns_spaced_reps.doc('get_spaced_repetitions')
     @ns_spaced_reps.marshal_list_with(spaced_rep_output)
+    @ns_spaced_reps.param('limit', 'Page size (newest first); omit to return every row', type=int)
+    @ns_spaced_reps.param('after_id', 'X-Next-Cursor value from the previous page', type=int)
     def get(self, user_id):
         """Get all spaced repetitions for a user"""
-        user = User.query.get_or_404(user_id)
-        spaced_reps = SpacedRepetition.query.filter_by(user_id=user_id).all()
-        return [sr.to_dict() for sr in spaced_reps]
+        ensure_user_exists(user_id)
+        query = SpacedRepetition.query.filter_by(user_id=user_id).with_entities(
+            *SPACED_REP_OUTPUT_COLUMNS
+        )
+        rows, headers = keyset_paginate(query, SpacedRepetition.id)
+        return [spaced_rep_row_to_dict(row) for row in rows], 200, headers
     
     @ns_spaced_reps.doc('add_to_spaced_repetition')
     @ns_spaced_reps.expect(spaced_rep_input)
     @ns_spaced_reps.marshal_with(spaced_rep_output, code=201)
     def post(self, user_id):
         """Add a note to spaced repetition"""
-        user = User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         data = request.json
         
         if not data or 'note_id' not in data:
             api.abort(400, 'note_id is required')
         
         note_id = data['note_id']
-        note = Note.query.get_or_404(note_id)
+        if db.session.scalar(
+            db.select(Note.id).where(Note.id == note_id, Note.user_id == user_id)
+        ) is None:
+            api.abort(404, 'Note not found')
         
-        existing = SpacedRepetition.query.filter_by(
-            user_id=user_id,
-            note_id=note_id
-        ).first()
-        
-        if existing:
-            api.abort(409, 'Note already in spaced repetition')
+        now = datetime.utcnow()
+        next_review = now + timedelta(days=1)
         
-        next_review = datetime.utcnow() + timedelta(days=1)
-        
-        spaced_rep = SpacedRepetition(
+        stmt = sqlite_insert(SpacedRepetition).values(
             user_id=user_id,
             note_id=note_id,
-            repetition_dates=json.dumps([]),
+            repetition_dates=[],
             revision_count=0,
-            next_review_date=next_review
-        )
+            next_review_date=next_review,
+            created_at=now
+        ).on_conflict_do_nothing(
+            index_elements=[SpacedRepetition.user_id, SpacedRepetition.note_id]
+        ).returning(SpacedRepetition)
+        spaced_rep = db.session.scalars(stmt).one_or_none()
+        
+        if spaced_rep is None:
+            api.abort(409, 'Note already in spaced repetition')
         
-        db.session.add(spaced_rep)
         db.session.commit()
         
         return spaced_rep.to_dict(), 201
 
 
+@ns_spaced_reps.route('/user/<int:user_id>/bulk')
+@ns_spaced_reps.param('user_id', 'The user identifier')
+class SpacedRepBulk(RestxResource):
+    @ns_spaced_reps.doc('bulk_add_to_spaced_repetition')
+    @ns_spaced_reps.expect(spaced_rep_bulk_input)
+    @ns_spaced_reps.marshal_list_with(spaced_rep_output, code=201)
+    def post(self, user_id):
+        """Add many notes to spaced repetition at once. Notes already tracked are skipped."""
+        ensure_user_exists(user_id)
+        data = request.json
+        
+        if not data or not isinstance(data.get('note_ids'), list):
+            api.abort(400, 'note_ids is required')
+        if any(type(note_id) is not int for note_id in data['note_ids']):
+            api.abort(400, 'note_ids must be integers')
+        # Keeps the multi-row INSERT well under SQLite's bound-parameter limit
+        if len(data['note_ids']) > MAX_PAGE_SIZE:
+            api.abort(400, f'At most {MAX_PAGE_SIZE} note_ids per request')
+        
+        note_ids = list(dict.fromkeys(data['note_ids']))
+        if not note_ids:
+            return [], 201
+        
+        found_ids = set(db.session.scalars(
+            db.select(Note.id).where(Note.user_id == user_id, Note.id.in_(note_ids))
+        ))
+        missing_ids = [note_id for note_id in note_ids if note_id not in found_ids]
+        if missing_ids:
+            api.abort(404, f'Notes not found: {missing_ids}')
+        
+        now = datetime.utcnow()
+        next_review = now + timedelta(days=1)
+        
+        # One multi-row INSERT; notes already in spaced repetition are skipped
+        # by the (user_id, note_id) unique constraint.
+        stmt = sqlite_insert(SpacedRepetition).values([
+            {
+                'user_id': user_id,
+                'note_id': note_id,
+                'repetition_dates': [],
+                'revision_count': 0,
+                'next_review_date': next_review,
+                'created_at': now
+            }
+            for note_id in note_ids
+        ]).on_conflict_do_nothing(
+            index_elements=[SpacedRepetition.user_id, SpacedRepetition.note_id]
+        ).returning(*SPACED_REP_OUTPUT_COLUMNS)
+        rows = db.session.execute(stmt).all()
+        db.session.commit()
+        
+        return [spaced_rep_row_to_dict(row) for row in rows], 201
+
+
 @ns_spaced_reps.route('/user/<int:user_id>/record-review')
 @ns_spaced_reps.param('user_id', 'The user identifier')
 class RecordNoteReview(RestxResource):
@@ -861,12 +1405,13 @@ class RecordNoteReview(RestxResource):
     @ns_spaced_reps.marshal_with(spaced_rep_output)
     def post(self, user_id):
         """Record opening a note as a repetition (creates SpacedRepetition for note if needed)."""
-        user = User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         data = request.json
         if not data or 'note_id' not in data:
             api.abort(400, 'note_id is required')
         note_id = data['note_id']
         Note.query.get_or_404(note_id)
+        now = datetime.utcnow()
 
         spaced_rep = SpacedRepetition.query.filter_by(
             user_id=user_id,
@@ -877,21 +1422,18 @@ class RecordNoteReview(RestxResource):
             spaced_rep = SpacedRepetition(
                 user_id=user_id,
                 note_id=note_id,
-                repetition_dates=json.dumps([]),
+                repetition_dates=[],
                 revision_count=0,
-                next_review_date=datetime.utcnow() + timedelta(days=1)
+                next_review_date=now + timedelta(days=1)
             )
             db.session.add(spaced_rep)
             db.session.flush()
 
         spaced_rep.revision_count += 1
-        rep_dates = json.loads(spaced_rep.repetition_dates) if spaced_rep.repetition_dates else []
-        rep_dates.append(datetime.utcnow().isoformat())
-        spaced_rep.repetition_dates = json.dumps(rep_dates)
-        intervals = [1, 3, 7, 14, 30, 60, 90]
-        interval_index = min(spaced_rep.revision_count - 1, len(intervals) - 1)
-        next_interval = intervals[interval_index]
-        spaced_rep.next_review_date = datetime.utcnow() + timedelta(days=next_interval)
+        spaced_rep.repetition_dates = spaced_rep.repetition_dates_list + [now.isoformat()]
+        interval_index = min(spaced_rep.revision_count - 1, len(SPACED_REP_INTERVALS) - 1)
+        next_interval = SPACED_REP_INTERVALS[interval_index]
+        spaced_rep.next_review_date = now + timedelta(days=next_interval)
         db.session.commit()
         return spaced_rep.to_dict()
 
@@ -917,26 +1459,21 @@ class SpacedRepByNote(RestxResource):
 @ns_spaced_reps.param('user_id', 'The user identifier')
 @ns_spaced_reps.param('year', 'Year for heatmap (default: current year)', _in='query')
 class SpacedRepHeatmap(RestxResource):
+    @conditional_get(heatmap_signature)
     @ns_spaced_reps.doc('get_heatmap_counts')
     def get(self, user_id):
         """Get daily repetition counts for heatmap (reviews per calendar day, optionally for a year)."""
-        user = User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         year_arg = request.args.get('year', type=int)
         year = year_arg if year_arg else datetime.utcnow().year
 
-        spaced_reps = SpacedRepetition.query.filter_by(user_id=user_id).all()
-        daily_counts = {}
-
-        for sr in spaced_reps:
-            rep_dates = json.loads(sr.repetition_dates) if sr.repetition_dates else []
-            for date_str in rep_dates:
-                try:
-                    dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                    if dt.year == year:
-                        date_key = dt.strftime('%Y-%m-%d')
-                        daily_counts[date_key] = daily_counts.get(date_key, 0) + 1
-                except (ValueError, TypeError):
-                    continue
+        # The key embeds the review signature, so any review or removal
+        # produces a new key and stale entries simply age out.
+        cache_key = f'heatmap:{user_id}:{year}:{heatmap_signature(user_id)}'
+        daily_counts = cache.get(cache_key)
+        if daily_counts is None:
+            daily_counts = count_daily_reviews(user_id, year)
+            cache.set(cache_key, daily_counts)
 
         return {'year': year, 'daily_counts': daily_counts}, 200
 
@@ -949,18 +1486,16 @@ class ReviewSpacedRep(RestxResource):
     def post(self, rep_id):
         """Mark a spaced repetition as reviewed"""
         spaced_rep = SpacedRepetition.query.get_or_404(rep_id)
+        now = datetime.utcnow()
         
         spaced_rep.revision_count += 1
         
-        rep_dates = json.loads(spaced_rep.repetition_dates) if spaced_rep.repetition_dates else []
-        rep_dates.append(datetime.utcnow().isoformat())
-        spaced_rep.repetition_dates = json.dumps(rep_dates)
+        spaced_rep.repetition_dates = spaced_rep.repetition_dates_list + [now.isoformat()]
         
-        intervals = [1, 3, 7, 14, 30, 60, 90]
-        interval_index = min(spaced_rep.revision_count - 1, len(intervals) - 1)
-        next_interval = intervals[interval_index]
+        interval_index = min(spaced_rep.revision_count - 1, len(SPACED_REP_INTERVALS) - 1)
+        next_interval = SPACED_REP_INTERVALS[interval_index]
         
-        spaced_rep.next_review_date = datetime.utcnow() + timedelta(days=next_interval)
+        spaced_rep.next_review_date = now + timedelta(days=next_interval)
         
         db.session.commit()
         
@@ -973,20 +1508,33 @@ class AssignmentList(RestxResource):
     @ns_assignments.doc('get_assignments')
     @ns_assignments.marshal_list_with(assignment_output)
     @ns_assignments.param('upcoming', 'Show only upcoming (true/false)')
+    @ns_assignments.param('limit', 'Page size (by due date); omit to return every assignment', type=int)
+    @ns_assignments.param('after_id', 'X-Next-Cursor value from the previous page')
     def get(self, user_id):
         """Get all assignments for a user"""
 
-        User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
 
         upcoming = request.args.get('upcoming', 'false').lower() == 'true'
 
-        query = Assignment.query.filter_by(user_id=user_id)
+        if 'limit' in request.args:
+            query = Assignment.query.filter_by(user_id=user_id)
+            if upcoming:
+                query = query.filter(Assignment.due_date_ts >= int(time.time()))
+            assignments, headers = keyset_paginate(query, Assignment.id, sort_column=Assignment.due_date_ts)
+            return assignments, 200, headers
+
+        # lambda_stmt caches the compiled SQL per filter combination; user_id
+        # and now_ts are extracted from the closures as bound parameters.
+        stmt = lambda_stmt(lambda: db.select(Assignment).where(Assignment.user_id == user_id))
 
         if upcoming:
-            query = query.filter(Assignment.due_date >= datetime.utcnow())
+            now_ts = int(time.time())
+            stmt += lambda s: s.where(Assignment.due_date_ts >= now_ts)
 
-        assignments = query.order_by(Assignment.due_date).all()
-        return [a.to_dict() for a in assignments]
+        stmt += lambda s: s.order_by(Assignment.due_date_ts, Assignment.id)
+        # Returned as ORM objects; marshal_list_with reads the attributes directly.
+        return db.session.execute(stmt).scalars().all()
 
     @ns_assignments.doc('create_assignment')
     @ns_assignments.expect(assignment_input)
@@ -994,7 +1542,7 @@ class AssignmentList(RestxResource):
     def post(self, user_id):
         """Create a new assignment. Tags provided will be automatically registered in the tags table."""
 
-        User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         data = request.json
 
         if not data or 'name' not in data or 'due_date' not in data:
@@ -1005,20 +1553,55 @@ class AssignmentList(RestxResource):
         assignment = Assignment(
             user_id=user_id,
             name=data['name'],
-            due_date=datetime.fromisoformat(data['due_date'].replace("Z", "+00:00")),
-            tags=json.dumps(tag_list),
+            due_date=parse_iso_datetime(data['due_date']),
             grade=data.get("grade"),
             weight=data.get("weight", 0)
         )
 
+        # Tags are linked before the assignment joins the session, so no flush
+        # or collection load is needed to attach them.
+        set_assignment_tags(assignment, tag_list)
         db.session.add(assignment)
-        db.session.flush()
+        db.session.commit()
+
+        return assignment.to_dict(), 201
+
 
-        sync_tags_from_assignment(user_id, assignment.id, tag_list)
+@ns_assignments.route('/user/<int:user_id>/batch')
+@ns_assignments.param('user_id', 'The user identifier')
+class AssignmentBatch(RestxResource):
+    @ns_assignments.doc('create_assignments_batch')
+    @ns_assignments.expect(assignment_batch_input)
+    @ns_assignments.marshal_list_with(assignment_output, code=201)
+    def post(self, user_id):
+        """Create several assignments in one request (JSON or application/x-ndjson). Their tags are registered together."""
+
+        ensure_user_exists(user_id)
 
+        assignments = []
+        assignment_tag_names = []
+        for index, item in enumerate(batch_items('assignments')):
+            if not isinstance(item, dict) or 'name' not in item or 'due_date' not in item:
+                api.abort(400, f'assignments[{index}]: name and due_date are required')
+
+            assignment = Assignment(
+                user_id=user_id,
+                name=item['name'],
+                due_date=parse_iso_datetime(item['due_date']),
+                grade=item.get("grade"),
+                weight=item.get("weight", 0)
+            )
+            assignments.append(assignment)
+            assignment_tag_names.append((assignment, item.get('tags', [])))
+
+        # Add first so rows are inserted in request order; with autoflush off the
+        # pending assignments get their tags without any collection loads.
+        db.session.add_all(assignments)
+        with db.session.no_autoflush:
+            set_assignments_tags(user_id, assignment_tag_names)
         db.session.commit()
 
-        return assignment.to_dict(), 201
+        return [assignment.to_dict() for assignment in assignments], 201
 
 
 
@@ -1036,11 +1619,9 @@ class AssignmentResource(RestxResource):
         if 'name' in data:
             assignment.name = data['name']
         if 'due_date' in data:
-            assignment.due_date = datetime.fromisoformat(data['due_date'].replace('Z', '+00:00'))
+            assignment.due_date = parse_iso_datetime(data['due_date'])
         if 'tags' in data:
-            tag_list = data['tags']
-            assignment.tags = json.dumps(tag_list)
-            sync_tags_from_assignment(assignment.user_id, assignment.id, tag_list)
+            set_assignment_tags(assignment, data['tags'])
         if 'grade' in data:
             assignment.grade = data['grade']
         if 'weight' in data:
@@ -1068,19 +1649,18 @@ class WeightedGrade(RestxResource):
     def get(self, user_id):
         """Calculate weighted grade average for a user"""
 
-        User.query.get_or_404(user_id)
-
-        assignments = Assignment.query.filter_by(user_id=user_id).all()
-
-        total_weight = 0
-        weighted_sum = 0
+        ensure_user_exists(user_id)
 
-        for a in assignments:
-            if a.grade is not None and a.weight > 0:
-                weighted_sum += a.grade * a.weight
-                total_weight += a.weight
+        weighted_sum, total_weight = db.session.query(
+            db.func.sum(Assignment.grade * Assignment.weight),
+            db.func.sum(Assignment.weight)
+        ).filter(
+            Assignment.user_id == user_id,
+            Assignment.grade.isnot(None),
+            Assignment.weight > 0
+        ).one()
 
-        if total_weight == 0:
+        if not total_weight:
             return {
                 "user_id": user_id,
                 "weighted_grade": None,
@@ -1103,9 +1683,8 @@ class TagList(RestxResource):
     @ns_tags.marshal_list_with(tag_output)
     def get(self, user_id):
         """Get all tags for a user (tags created from assignments)"""
-        User.query.get_or_404(user_id)
-        tags = Tag.query.filter_by(user_id=user_id).order_by(Tag.name).all()
-        return [tag.to_dict() for tag in tags]
+        ensure_user_exists(user_id)
+        return cached_user_tags(user_id)
     
     @ns_tags.doc('create_tag')
     @ns_tags.expect(tag_input)
@@ -1116,7 +1695,7 @@ class TagList(RestxResource):
         Note: Tags are typically created automatically when assignments are created.
         This endpoint allows manual tag creation if needed.
         """
-        User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         data = request.json
         
         if not data or 'name' not in data:
@@ -1126,18 +1705,19 @@ class TagList(RestxResource):
         if not tag_name:
             api.abort(400, 'Tag name cannot be empty')
         
-        existing_tag = Tag.query.filter_by(user_id=user_id, name=tag_name).first()
-        if existing_tag:
-            api.abort(409, f'Tag "{tag_name}" already exists')
-        
-        tag = Tag(
+        stmt = sqlite_insert(Tag).values(
             user_id=user_id,
             name=tag_name,
             source_assignment_id=data.get('source_assignment_id')
-        )
+        ).on_conflict_do_nothing(
+            index_elements=[Tag.user_id, Tag.name]
+        ).returning(Tag)
+        tag = db.session.scalars(stmt).one_or_none()
+        if tag is None:
+            api.abort(409, f'Tag "{tag_name}" already exists')
         
-        db.session.add(tag)
         db.session.commit()
+        invalidate_user_tags(user_id)
         
         return tag.to_dict(), 201
 
@@ -1161,6 +1741,16 @@ class TagResource(RestxResource):
         Notes with this tag will keep the tag, but it won't be valid for new notes.
         """
         tag = Tag.query.get_or_404(tag_id)
+        # Losing the tag changes its assignments' tag lists, which the plan cache
+        # only notices through their updated_at (as in set_assignments_tags)
+        db.session.execute(
+            db.update(Assignment)
+            .where(Assignment.id.in_(
+                db.select(assignment_tags.c.assignment_id).where(assignment_tags.c.tag_id == tag_id)
+            ))
+            .values(updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
         db.session.delete(tag)
         db.session.commit()
         
@@ -1173,11 +1763,11 @@ class TagNameList(RestxResource):
     @ns_tags.doc('get_tag_names')
     def get(self, user_id):
         """Get just the tag names for a user (useful for autocomplete)"""
-        User.query.get_or_404(user_id)
-        tags = Tag.query.filter_by(user_id=user_id).order_by(Tag.name).all()
+        ensure_user_exists(user_id)
+        tags = cached_user_tags(user_id)
         return {
             'user_id': user_id,
-            'tags': [tag.name for tag in tags],
+            'tags': [tag['name'] for tag in tags],
             'count': len(tags)
         }
 
@@ -1188,28 +1778,22 @@ class SyncTags(RestxResource):
     @ns_tags.doc('sync_tags')
     def post(self, user_id):
         """
-        Sync all tags from existing assignments.
-        This is useful if assignments were created before the tag system was in place.
+        Sync tags from existing assignments.
+        Assignment tags are registered as assignments are written, and lists from
+        the old assignments.tags column are migrated at startup, so there is
+        nothing left to create; this reports the user's tags.
         """
-        User.query.get_or_404(user_id)
-        
-        assignments = Assignment.query.filter_by(user_id=user_id).all()
+        ensure_user_exists(user_id)
         
-        created_tags = []
-        for assignment in assignments:
-            tag_list = json.loads(assignment.tags) if assignment.tags else []
-            new_tags = sync_tags_from_assignment(user_id, assignment.id, tag_list)
-            created_tags.extend(new_tags)
-        
-        db.session.commit()
-
-        all_tags = Tag.query.filter_by(user_id=user_id).order_by(Tag.name).all()
+        all_tags = db.session.scalars(
+            db.select(Tag.name).where(Tag.user_id == user_id).order_by(Tag.name)
+        ).all()
         
         return {
             'message': 'Tags synced successfully',
-            'new_tags_created': created_tags,
+            'new_tags_created': [],
             'total_tags': len(all_tags),
-            'all_tags': [tag.name for tag in all_tags]
+            'all_tags': all_tags
         }
 
 
@@ -1220,16 +1804,15 @@ class CourseList(RestxResource):
     @ns_courses.marshal_list_with(course_output)
     def get(self, user_id):
         """Get all courses for a user"""
-        User.query.get_or_404(user_id)
-        courses = Course.query.filter_by(user_id=user_id).order_by(Course.created_at.desc()).all()
-        return [c.to_dict() for c in courses]
+        ensure_user_exists(user_id)
+        return cached_user_courses(user_id)
     
     @ns_courses.doc('create_course')
     @ns_courses.expect(course_input)
     @ns_courses.marshal_with(course_output, code=201)
     def post(self, user_id):
         """Create a new course"""
-        User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         data = request.json
         
         if not data or 'name' not in data or 'code' not in data:
@@ -1293,13 +1876,15 @@ class CourseItem(RestxResource):
         """Delete a course and all its resources"""
         course = Course.query.get_or_404(course_id)
 
-        for resource in course.resources:
-            if os.path.exists(resource.file_path):
-                try:
-                    os.remove(resource.file_path)
-                except OSError as e:
-                    print(f"Error deleting file {resource.file_path}: {e}")
+        # Course.resources is a dynamic relationship, so it can't be eager-loaded;
+        # read only the file paths, then remove the rows with one bulk DELETE.
+        resource_files = db.session.scalars(
+            db.select(Resource.file_path).where(Resource.course_id == course_id)
+        ).all()
+        for file_path, e in remove_files(resource_files):
+            logger.warning(f"Error deleting file {file_path}: {e}")
         
+        Resource.query.filter_by(course_id=course_id).delete(synchronize_session=False)
         db.session.delete(course)
         db.session.commit()
         
@@ -1333,7 +1918,7 @@ class ResourceUpload(RestxResource):
     @ns_resources.marshal_with(resource_output, code=201)
     def post(self, user_id):
         """Upload a new resource file (lecture material)"""
-        User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         
         if 'file' not in request.files:
             api.abort(400, 'No file provided')
@@ -1372,10 +1957,12 @@ class ResourceUpload(RestxResource):
         os.makedirs(user_folder, exist_ok=True)
         
         file_path = os.path.join(user_folder, unique_filename)
-        file.save(file_path)
-        
-        file_size = os.path.getsize(file_path)
-        mime_type = mimetypes.guess_type(original_filename)[0] or 'application/octet-stream'
+        file_size = save_upload(file, file_path)
+        # Trust the part's declared Content-Type; only guess from the extension
+        # when the client sent none or the generic octet-stream.
+        mime_type = file.mimetype
+        if not mime_type or mime_type == 'application/octet-stream':
+            mime_type = mimetypes.guess_type(original_filename)[0] or 'application/octet-stream'
         file_type = get_file_type(original_filename)
         
         resource = Resource(
@@ -1406,9 +1993,11 @@ class ResourceList(RestxResource):
     @ns_resources.param('course_id', 'Filter by course ID')
     @ns_resources.param('week_number', 'Filter by week number')
     @ns_resources.param('file_type', 'Filter by file type (pdf, video, audio, document, image, archive, other)')
+    @ns_resources.param('limit', 'Page size (newest first); omit to return every resource', type=int)
+    @ns_resources.param('after_id', 'X-Next-Cursor value from the previous page', type=int)
     def get(self, user_id):
         """Get all resources for a user"""
-        User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         
         query = Resource.query.filter_by(user_id=user_id)
         
@@ -1423,8 +2012,8 @@ class ResourceList(RestxResource):
         if file_type:
             query = query.filter_by(file_type=file_type)
         
-        resources = query.order_by(Resource.created_at.desc()).all()
-        return [r.to_dict() for r in resources]
+        resources, headers = keyset_paginate(query.order_by(Resource.created_at.desc()), Resource.id)
+        return [r.to_dict() for r in resources], 200, headers
 
 
 @ns_resources.route('/<int:resource_id>')
@@ -1471,7 +2060,7 @@ class ResourceItem(RestxResource):
             try:
                 os.remove(resource.file_path)
             except OSError as e:
-                print(f"Error deleting file {resource.file_path}: {e}")
+                logger.warning(f"Error deleting file {resource.file_path}: {e}")
         
         db.session.delete(resource)
         db.session.commit()
@@ -1506,30 +2095,34 @@ class ResourceCourses(RestxResource):
     @ns_resources.doc('get_resource_courses')
     def get(self, user_id):
         """Get all unique courses that have resources"""
-        User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         
-        resources = Resource.query.filter_by(user_id=user_id).filter(
+        course_counts = db.session.query(
+            Resource.course_id, Course.name, db.func.count(Resource.id)
+        ).outerjoin(Course, Course.id == Resource.course_id).filter(
+            Resource.user_id == user_id,
             Resource.course_id.isnot(None)
-        ).all()
-        
-        courses = {}
-        for r in resources:
-            if r.course_id and r.course_id not in courses:
-                courses[r.course_id] = {
-                    'course_id': r.course_id,
-                    'course_name': r.course_name or r.course_id,
-                    'resource_count': 0,
-                    'weeks': set()
-                }
-            if r.course_id:
-                courses[r.course_id]['resource_count'] += 1
-                if r.week_number:
-                    courses[r.course_id]['weeks'].add(r.week_number)
-        
-        result = []
-        for course in courses.values():
-            course['weeks'] = sorted(list(course['weeks']))
-            result.append(course)
+        ).group_by(Resource.course_id, Course.name).order_by(Resource.course_id).all()
+        
+        course_weeks = db.session.query(Resource.course_id, Resource.week_number).filter(
+            Resource.user_id == user_id,
+            Resource.course_id.isnot(None),
+            Resource.week_number.isnot(None)
+        ).distinct().order_by(Resource.course_id, Resource.week_number).all()
+        
+        weeks_by_course = {}
+        for course_id, week_number in course_weeks:
+            weeks_by_course.setdefault(course_id, []).append(week_number)
+        
+        result = [
+            {
+                'course_id': course_id,
+                'course_name': course_name or course_id,
+                'resource_count': resource_count,
+                'weeks': weeks_by_course.get(course_id, [])
+            }
+            for course_id, course_name, resource_count in course_counts
+        ]
         
         return {'courses': result}
 
@@ -1540,29 +2133,32 @@ class ResourceBatchDelete(RestxResource):
     @ns_resources.doc('batch_delete_resources')
     def post(self, user_id):
         """Delete multiple resources at once"""
-        User.query.get_or_404(user_id)
+        ensure_user_exists(user_id)
         data = request.json
         
         if not data or 'resource_ids' not in data:
             api.abort(400, 'resource_ids is required')
         
         resource_ids = data['resource_ids']
-        deleted_count = 0
         errors = []
         
-        for resource_id in resource_ids:
-            resource = Resource.query.filter_by(id=resource_id, user_id=user_id).first()
-            if resource:
-                if os.path.exists(resource.file_path):
-                    try:
-                        os.remove(resource.file_path)
-                    except OSError as e:
-                        errors.append(f"Error deleting file for resource {resource_id}: {e}")
-                
-                db.session.delete(resource)
-                deleted_count += 1
+        rows = db.session.query(Resource.id, Resource.file_path).filter(
+            Resource.user_id == user_id,
+            Resource.id.in_(resource_ids)
+        ).all()
+        
+        resource_by_path = {file_path: resource_id for resource_id, file_path in rows}
+        for file_path, e in remove_files(list(resource_by_path)):
+            errors.append(f"Error deleting file for resource {resource_by_path[file_path]}: {e}")
         
+        deleted_count = len(rows)
+        if rows:
+            Resource.query.filter(
+                Resource.id.in_([resource_id for resource_id, _ in rows])
+            ).delete(synchronize_session=False)
         db.session.commit()
+        # Bulk deletes bypass the flush hooks that invalidate cached lists.
+        invalidate_user_courses(user_id)
         
         return {
             'message': f'Deleted {deleted_count} resources',
@@ -1571,56 +2167,303 @@ class ResourceBatchDelete(RestxResource):
         }
 
 
-def sync_tags_from_assignment(user_id, assignment_id, tag_names):
+KNOWN_USER_CACHE_SIZE = 10000
+_known_user_ids = OrderedDict()
+_known_user_ids_lock = threading.Lock()
+
+
+def ensure_user_exists(user_id):
     """
-    Create tags from an assignment's tag list.
-    Tags are only created if they don't already exist for the user.
+    Abort with 404 unless the user exists, without loading the full row.
+    Only hits are remembered (per process), so a user created by another
+    worker is never reported missing; deletes are forgotten via session events.
     """
-    created_tags = []
-    for tag_name in tag_names:
-        tag_name = tag_name.strip()
-        if not tag_name:
+    with _known_user_ids_lock:
+        if user_id in _known_user_ids:
+            _known_user_ids.move_to_end(user_id)
+            return
+    
+    if db.session.query(User.id).filter_by(id=user_id).scalar() is None:
+        api.abort(404, f'User {user_id} not found')
+    
+    with _known_user_ids_lock:
+        _known_user_ids[user_id] = True
+        if len(_known_user_ids) > KNOWN_USER_CACHE_SIZE:
+            _known_user_ids.popitem(last=False)
+
+
+def batch_items(key):
+    """
+    Items of a batch create request: either a JSON body {key: [...]} or an
+    application/x-ndjson body with one object per line. NDJSON is decoded line
+    by line as it is read, so the client can stream items as it builds them.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        return _ndjson_items(request.stream)
+    
+    data = request.json
+    if not data or not isinstance(data.get(key), list):
+        api.abort(400, f'{key} is required')
+    return data[key]
+
+
+def _ndjson_items(stream):
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
             continue
-        
-        existing_tag = Tag.query.filter_by(user_id=user_id, name=tag_name).first()
-        if not existing_tag:
-            new_tag = Tag(
-                user_id=user_id,
-                name=tag_name,
-                source_assignment_id=assignment_id
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError:
+            api.abort(400, f'line {line_number}: invalid JSON')
+
+
+def keyset_paginate(query, id_column, sort_column=None):
+    """
+    Opt-in keyset pagination driven by ?limit=N&after_id=CURSOR.
+    By default pages are ordered newest first by id and the cursor is the last
+    id seen. With an integer sort_column pages run in ascending
+    (sort_column, id) order, skipping rows where it is NULL, and the cursor
+    is "<sort value>:<id>".
+    The X-Next-Cursor header carries the cursor for the following page and is
+    omitted on the last one. Without limit every row is returned, in the
+    query's own order. Returns (rows, headers).
+    """
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        return query.all(), {}
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    cursor = request.args.get('after_id')
+    try:
+        if sort_column is None:
+            order = (id_column.desc(),)
+            if cursor:
+                query = query.filter(id_column < int(cursor))
+        else:
+            order = (sort_column, id_column)
+            # Rows without a sort value can't be placed in the cursor order
+            query = query.filter(sort_column.is_not(None))
+            if cursor:
+                sort_value, after_id = (int(part) for part in cursor.split(':'))
+                query = query.filter(db.tuple_(sort_column, id_column) > (sort_value, after_id))
+    except ValueError:
+        api.abort(400, f'Invalid after_id cursor: {cursor}')
+
+    # Fetch one extra row to know whether another page exists.
+    rows = query.order_by(None).order_by(*order).limit(limit + 1).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if sort_column is None:
+            headers['X-Next-Cursor'] = str(last.id)
+        else:
+            headers['X-Next-Cursor'] = f'{getattr(last, sort_column.key)}:{last.id}'
+    return rows, headers
+
+def upsert_study_plan(user_id, plan):
+    """
+    Insert or replace a user's study plan in one INSERT ... ON CONFLICT statement.
+    Returns (study_plan, created).
+    """
+    now = datetime.utcnow()
+    stmt = sqlite_insert(StudyPlan).values(
+        user_id=user_id,
+        study_plan=plan,
+        created_at=now,
+        updated_at=now
+    ).on_conflict_do_update(
+        index_elements=[StudyPlan.user_id],
+        set_={'study_plan': plan, 'updated_at': now}
+    ).returning(StudyPlan)
+    study_plan = db.session.scalars(
+        stmt, execution_options={'populate_existing': True}
+    ).one()
+    return study_plan, study_plan.created_at == now
+
+
+def set_assignment_tags(assignment, tag_names):
+    """
+    Link an assignment to the user's tags named in tag_names, creating any tag
+    that doesn't exist yet. Returns the names of the tags created.
+    """
+    return set_assignments_tags(assignment.user_id, [(assignment, tag_names)])
+
+
+def set_assignments_tags(user_id, assignment_tag_names):
+    """
+    Bulk form of set_assignment_tags for (assignment, tag_names) pairs of one user.
+    Existing tags for the whole batch are looked up with a single IN query.
+    Returns the names of the tags created.
+    """
+    names_by_assignment = [
+        (assignment, [name for name in dict.fromkeys(tag_name.strip() for tag_name in tag_names) if name])
+        for assignment, tag_names in assignment_tag_names
+    ]
+    all_names = list(dict.fromkeys(chain.from_iterable(names for _, names in names_by_assignment)))
+    created_tags = []
+    tags_by_name = {}
+    if all_names:
+        # INSERT ... ON CONFLICT DO NOTHING on (user_id, name) creates the missing
+        # tags in one statement and can't collide with a concurrent request.
+        created = set(db.session.scalars(
+            sqlite_insert(Tag).values([{'user_id': user_id, 'name': name} for name in all_names])
+            .on_conflict_do_nothing(index_elements=[Tag.user_id, Tag.name])
+            .returning(Tag.name)
+        ))
+        created_tags = [name for name in all_names if name in created]
+        tags_by_name = {
+            tag.name: tag for tag in Tag.query.filter(
+                Tag.user_id == user_id, Tag.name.in_(all_names)
             )
-            db.session.add(new_tag)
-            created_tags.append(tag_name)
+        }
+    
+    unsourced = set(created_tags)
+    now = datetime.utcnow()
+    for assignment, names in names_by_assignment:
+        for name in names:
+            if name in unsourced:
+                tags_by_name[name].source_assignment = assignment
+                unsourced.discard(name)
+        assignment.tag_objects = [tags_by_name[name] for name in names]
+        # Changing the association doesn't update the assignments row itself, so
+        # bump updated_at for the plan cache and ETag signatures.
+        assignment.updated_at = now
+    
+    if created_tags:
+        g.pop('_valid_tags_by_user', None)
     
     return created_tags
 
 
+def request_cache(name):
+    """Get a dict stored on flask.g that lives for the current request only"""
+    cache = g.get(name)
+    if cache is None:
+        cache = {}
+        setattr(g, name, cache)
+    return cache
+
+
 def validate_note_tags(user_id, tag_names):
     """
     Validate that all tags exist for this user (were created from assignments).
     Returns a tuple of (valid_tags, invalid_tags).
+    Checks against the request-scoped tag set, so only the first call per user hits the database.
     """
-    valid_tags = []
-    invalid_tags = []
-    
-    for tag_name in tag_names:
-        tag_name = tag_name.strip()
-        if not tag_name:
-            continue
-        
-        existing_tag = Tag.query.filter_by(user_id=user_id, name=tag_name).first()
-        if existing_tag:
-            valid_tags.append(tag_name)
-        else:
-            invalid_tags.append(tag_name)
+    user_tags = user_tag_names(user_id)
+    names = [tag_name.strip() for tag_name in tag_names if tag_name.strip()]
+    valid_tags = [name for name in names if name in user_tags]
+    invalid_tags = [name for name in names if name not in user_tags]
     
     return valid_tags, invalid_tags
 
 
+def note_has_tag(tag_name):
+    """SQL predicate matching notes whose JSON tags array contains tag_name"""
+    tag_values = db.func.json_each(Note.tags).table_valued('value')
+    return db.select(tag_values.c.value).where(tag_values.c.value == tag_name).exists()
+
+
+def user_tag_names(user_id):
+    """Set of a user's tag names, loaded once and memoized for the rest of the request"""
+    cache = request_cache('_valid_tags_by_user')
+    if user_id not in cache:
+        cache[user_id] = set(db.session.scalars(db.select(Tag.name).where(Tag.user_id == user_id)))
+    return cache[user_id]
+
+
 def get_valid_tags_for_user(user_id):
-    """Get all valid tag names for a user."""
-    tags = Tag.query.filter_by(user_id=user_id).all()
-    return [tag.name for tag in tags]
+    """Get all valid tag names for a user (memoized for the rest of the request)."""
+    return sorted(user_tag_names(user_id))
+
+
+USER_LIST_CACHE_TIMEOUT = 120
+# Commits only invalidate the cache they can reach. A per-process backend would
+# let other gunicorn workers keep serving a stale list, so the tag and course
+# lists are only memoized when CACHE_TYPE is shared (e.g. RedisCache).
+USER_LIST_CACHE_ENABLED = not isinstance(cache.cache, (SimpleCache, NullCache))
+
+
+def memoize_user_list(loader):
+    if not USER_LIST_CACHE_ENABLED:
+        return loader
+    return cache.memoize(timeout=USER_LIST_CACHE_TIMEOUT)(loader)
+
+
+@memoize_user_list
+def cached_user_tags(user_id):
+    """A user's tags as dicts ordered by name, shared across requests until they change"""
+    return [tag.to_dict() for tag in Tag.query.filter_by(user_id=user_id).order_by(Tag.name)]
+
+
+@memoize_user_list
+def cached_user_courses(user_id):
+    """A user's courses as dicts, newest first, shared across requests until they change"""
+    courses = Course.query.filter_by(user_id=user_id).order_by(Course.created_at.desc())
+    return [course.to_dict() for course in courses]
+
+
+def invalidate_user_list(loader, user_id):
+    if USER_LIST_CACHE_ENABLED:
+        cache.delete_memoized(loader, user_id)
+
+
+def invalidate_user_tags(user_id):
+    invalidate_user_list(cached_user_tags, user_id)
+
+
+def invalidate_user_courses(user_id):
+    invalidate_user_list(cached_user_courses, user_id)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_cached_list_changes(session, flush_context):
+    """Remember which users' cached tag/course lists a flush touched"""
+    changed = session.info.setdefault('cached_list_changes', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Tag):
+            changed.add((cached_user_tags, obj.user_id))
+        elif isinstance(obj, (Course, Resource)):
+            # Resources feed Course.resource_count
+            changed.add((cached_user_courses, obj.user_id))
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            with _known_user_ids_lock:
+                _known_user_ids.pop(obj.id, None)
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_cached_lists(session):
+    for loader, user_id in session.info.pop('cached_list_changes', ()):
+        invalidate_user_list(loader, user_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_cached_list_changes(session):
+    session.info.pop('cached_list_changes', None)
+
+
+def count_daily_reviews(user_id, year):
+    """Count a user's spaced-repetition reviews per calendar day of the given year."""
+    # Only the repetition_dates column is needed; rows with no review in the
+    # requested year are skipped by the database.
+    rows = db.session.query(SpacedRepetition.repetition_dates).filter(
+        SpacedRepetition.user_id == user_id,
+        db.cast(SpacedRepetition.repetition_dates, db.Text).like(f'%"{year}-%')
+    ).all()
+    daily_counts = Counter()
+
+    for (rep_dates,) in rows:
+        for date_str in rep_dates or []:
+            try:
+                dt = parse_iso_datetime(date_str)
+                if dt.year == year:
+                    daily_counts[dt.date().isoformat()] += 1
+            except (ValueError, TypeError):
+                continue
+
+    return dict(daily_counts)
 
 
 def generate_monthly_plan_logic(start_date, notes, assignments):
@@ -1633,45 +2476,48 @@ def generate_monthly_plan_logic(start_date, notes, assignments):
         if start_date <= a.due_date <= end_date
     ]
     
-    priority_tags = set()
-    for assignment in upcoming_assignments:
-        tags = json.loads(assignment.tags) if assignment.tags else []
-        priority_tags.update(tags)
+    priority_tags = set(chain.from_iterable(a.tags_list for a in upcoming_assignments))
     
     priority_notes = []
     regular_notes = []
     
     for note in notes:
-        note_tags = json.loads(note.tags) if note.tags else []
-        if any(tag in priority_tags for tag in note_tags):
+        if not priority_tags.isdisjoint(note.tags_list):
             priority_notes.append(note)
         else:
             regular_notes.append(note)
     
     time_slots = ["09:00", "11:00", "14:00", "16:00", "19:00"]
     
-    priority_index = 0
-    regular_index = 0
-    
-    for day_offset in range(30):
-        current_date = start_date + timedelta(days=day_offset)
-        date_str = current_date.strftime('%m/%d/%Y')
-        
-        monthly_plan[date_str] = {}
-        
-        days_to_nearest_assignment = min(
-            [(a.due_date - current_date).days for a in upcoming_assignments],
-            default=30
-        )
+    # The nearest assignment for any day is always the earliest one due, so the
+    # per-day priority slot counts can be computed up front without rescanning
+    # every assignment for each day.
+    earliest_due = min((a.due_date for a in upcoming_assignments), default=None)
+    day_dates = [start_date + timedelta(days=day_offset) for day_offset in range(30)]
+    priority_slots_per_day = []
+    for current_date in day_dates:
+        days_to_nearest_assignment = (earliest_due - current_date).days if earliest_due else 30
         
         if days_to_nearest_assignment <= 7:
-            priority_slots = 4
+            priority_slots_per_day.append(4)
         elif days_to_nearest_assignment <= 14:
-            priority_slots = 3
+            priority_slots_per_day.append(3)
         elif days_to_nearest_assignment <= 21:
-            priority_slots = 2
+            priority_slots_per_day.append(2)
         else:
-            priority_slots = 1
+            priority_slots_per_day.append(1)
+    
+    priority_index = 0
+    regular_index = 0
+    
+    # Each note gets one slot entry that is shared by every slot it fills,
+    # instead of rebuilding the same dict and lists for all 150 slots.
+    slot_entries = {}
+    
+    for current_date, priority_slots in zip(day_dates, priority_slots_per_day):
+        date_str = current_date.strftime('%m/%d/%Y')
+        
+        day_plan = monthly_plan[date_str] = {}
         
         for slot_index, time_slot in enumerate(time_slots):
             if slot_index < priority_slots and priority_notes:
@@ -1687,16 +2533,72 @@ def generate_monthly_plan_logic(start_date, notes, assignments):
                 else:
                     continue
             
-            note_tags = json.loads(note.tags) if note.tags else []
+            entry = slot_entries.get(note.id)
+            if entry is None:
+                entry = slot_entries[note.id] = {
+                    "subject": [note.subject or "Study Session"],
+                    "tags": note.tags_list,
+                    "associated_notes": [note.id]
+                }
             
-            monthly_plan[date_str][time_slot] = {
-                "subject": [note.subject or "Study Session"],
-                "tags": note_tags,
-                "associated_notes": [note.id]
-            }
+            day_plan[time_slot] = entry
     
     return monthly_plan
 
+
+PLAN_CACHE_SIZE = 1024
+_plan_cache = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+def get_cached_monthly_plan(user_id, start_date):
+    """
+    Return the monthly plan for a user, regenerating it only when the user's
+    notes or assignments changed since it was last computed.
+    The cache key uses row counts and the latest updated_at of each table,
+    so creates, updates and deletes all produce a new key.
+    """
+    # Both tables' signatures are fetched as scalar subqueries of one SELECT.
+    notes_stmt = db.select(Note.id).where(Note.user_id == user_id)
+    assignments_stmt = db.select(Assignment.id).where(Assignment.user_id == user_id)
+    signature = tuple(db.session.execute(db.select(
+        notes_stmt.with_only_columns(db.func.count(Note.id)).scalar_subquery(),
+        notes_stmt.with_only_columns(db.func.max(Note.updated_at)).scalar_subquery(),
+        assignments_stmt.with_only_columns(db.func.count(Assignment.id)).scalar_subquery(),
+        assignments_stmt.with_only_columns(db.func.max(Assignment.updated_at)).scalar_subquery()
+    )).one())
+    key = (user_id, start_date, signature)
+
+    with _plan_cache_lock:
+        monthly_plan = _plan_cache.get(key)
+        if monthly_plan is not None:
+            _plan_cache.move_to_end(key)
+            return monthly_plan
+
+    # The plan only renders note id, subject and tags and reads assignment due
+    # dates and tags, so skip loading the remaining columns.
+    notes = Note.query.filter_by(user_id=user_id).options(
+        db.load_only(Note.id, Note.subject, Note.tags)
+    ).all()
+    assignments = Assignment.query.filter_by(user_id=user_id).filter(
+        Assignment.due_date_ts >= to_utc_timestamp(start_date)
+    ).options(
+        db.load_only(Assignment.id, Assignment.due_date)
+    ).all()
+
+    monthly_plan = generate_monthly_plan_logic(
+        start_date=start_date,
+        notes=notes,
+        assignments=assignments
+    )
+
+    with _plan_cache_lock:
+        _plan_cache[key] = monthly_plan
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+
+    return monthly_plan
+
 @ns_chat.route('/user/<int:user_id>/message')
 @ns_chat.param('user_id', 'The user identifier')
 @ns_chat.response(404, 'User not found')
@@ -1707,39 +2609,67 @@ class ChatMessage(RestxResource):
     @ns_chat.marshal_with(chat_response_output)
     def post(self, user_id):
         """Send a message to the AI assistant"""
-        try:
-            from ai_chat import chat_with_ai
-        except ImportError:
-            api.abort(500, 'AI chat module not properly configured. Ensure ai_chat.py is in the project directory.')
-        
-        user = User.query.get(user_id)
-        if not user:
-            api.abort(404, f'User {user_id} not found')
-        
-        data = request.json
-        
-        if not data or 'message' not in data:
-            api.abort(400, 'message is required')
+        ensure_user_exists(user_id)
         
-        user_message = data['message']
-        conversation_history = data.get('conversation_history', [])
-        source = data.get('source')
-        note_context = data.get('note_context')
+        body = parse_json_body(ChatMessageBody)
         
         try:
-            result = chat_with_ai(user_id, user_message, conversation_history, source=source, note_context=note_context)
+            result = run_ai_call(chat_with_ai, user_id, body.message, body.conversation_history,
+                                 source=body.source, note_context=body.note_context)
             
             return {
                 'response': result['response'],
                 'conversation_history': result['conversation_history'],
                 'tokens_used': result['tokens_used'],
-                'timestamp': datetime.utcnow().isoformat()
+                'timestamp': now_iso()
             }
         
+        except TimeoutError:
+            api.abort(504, 'AI assistant timed out')
         except Exception as e:
             api.abort(500, f'Error communicating with AI: {str(e)}')
 
 
+@ns_chat.route('/user/<int:user_id>/message/stream')
+@ns_chat.param('user_id', 'The user identifier')
+@ns_chat.response(404, 'User not found')
+class ChatMessageStream(RestxResource):
+    @ns_chat.doc('stream_chat_message', produces=['text/event-stream'])
+    @ns_chat.expect(chat_message_input)
+    def post(self, user_id):
+        """
+        Send a message to the AI assistant and stream the reply as Server-Sent Events.
+        Emits {"delta": ...} events while the reply is generated, then a final
+        {"done": true, "conversation_history": [...]} or {"error": ...} event.
+        """
+        ensure_user_exists(user_id)
+        
+        body = parse_json_body(ChatMessageBody)
+        
+        reply = stream_chat_with_ai(
+            user_id,
+            body.message,
+            body.conversation_history,
+            source=body.source,
+            note_context=body.note_context
+        )
+        
+        def generate():
+            try:
+                while True:
+                    yield sse_event({'delta': next(reply)})
+            except StopIteration as finished:
+                yield sse_event({
+                    'done': True,
+                    'conversation_history': finished.value,
+                    'timestamp': now_iso()
+                })
+            except Exception as e:
+                yield sse_event({'error': f'Error communicating with AI: {str(e)}'})
+        
+        return sse_response(generate())
+
+
 @ns_chat.route('/user/<int:user_id>/session/end')
 @ns_chat.param('user_id', 'The user identifier')
 @ns_chat.response(404, 'User not found')
@@ -1749,24 +2679,12 @@ class ChatSessionEnd(RestxResource):
     @ns_chat.expect(chat_session_end_input)
     def post(self, user_id):
         """End a chat session and save conversation summary to context"""
-        try:
-            from ai_chat import end_conversation_session
-        except ImportError:
-            api.abort(500, 'AI chat module not properly configured')
-        
-        user = User.query.get(user_id)
-        if not user:
-            api.abort(404, f'User {user_id} not found')
-        
-        data = request.json
+        ensure_user_exists(user_id)
         
-        if not data or 'conversation_history' not in data:
-            api.abort(400, 'conversation_history is required')
-        
-        conversation_history = data['conversation_history']
+        body = parse_json_body(ChatSessionEndBody)
         
         try:
-            context_entry = end_conversation_session(user_id, conversation_history)
+            context_entry = end_conversation_session(user_id, body.conversation_history)
             
             if context_entry:
                 return {
@@ -1791,14 +2709,7 @@ class ChatContext(RestxResource):
     @ns_chat.marshal_with(context_output)
     def get(self, user_id):
         """Get the full context history for a user"""
-        try:
-            from ai_chat import load_context
-        except ImportError:
-            api.abort(500, 'AI chat module not properly configured')
-        
-        user = User.query.get(user_id)
-        if not user:
-            api.abort(404, f'User {user_id} not found')
+        ensure_user_exists(user_id)
         
         try:
             context = load_context(user_id)
@@ -1810,14 +2721,7 @@ class ChatContext(RestxResource):
     @ns_chat.doc('clear_chat_context')
     def delete(self, user_id):
         """Clear all context history for a user"""
-        try:
-            from ai_chat import clear_context
-        except ImportError:
-            api.abort(500, 'AI chat module not properly configured')
-        
-        user = User.query.get(user_id)
-        if not user:
-            api.abort(404, f'User {user_id} not found')
+        ensure_user_exists(user_id)
         
         try:
             context = clear_context(user_id)
@@ -1839,14 +2743,7 @@ class ChatContextStats(RestxResource):
     @ns_chat.marshal_with(context_stats_output)
     def get(self, user_id):
         """Get statistics about the user's context history"""
-        try:
-            from ai_chat import get_context_stats
-        except ImportError:
-            api.abort(500, 'AI chat module not properly configured')
-        
-        user = User.query.get(user_id)
-        if not user:
-            api.abort(404, f'User {user_id} not found')
+        ensure_user_exists(user_id)
         
         try:
             stats = get_context_stats(user_id)
@@ -1859,7 +2756,7 @@ class ChatContextStats(RestxResource):
 class HealthCheck(RestxResource):
     def get(self):
         """Health check endpoint"""
-        return {'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}, 200
+        return {'status': 'healthy', 'timestamp': now_iso()}, 200
 
 @app.route('/api/users/<int:user_id>/generate-ai-note', methods=['POST'])
 def generate_ai_note(user_id):
@@ -1873,14 +2770,15 @@ def generate_ai_note(user_id):
     note_id = data["note_id"]
     logger.info(f"Fetching note ID={note_id}")
 
+    note = db.session.get(Note, note_id, options=[db.load_only(Note.subject, Note.tags, Note.content)])
+    if note is None:
+        return jsonify({"error": f"Note {note_id} not found"}), 404
 
     try:
-        note = Note.query.get_or_404(note_id)
-        print(note)
         lecture_text = extract_text_from_note(note)
 
         logger.info("Calling AI generation function")
-        summary, questions = generate_summary_and_questions(lecture_text)
+        summary, questions = run_ai_call(generate_summary_and_questions, lecture_text)
 
         logger.info("AI generation successful")
 
@@ -1889,9 +2787,13 @@ def generate_ai_note(user_id):
             "questions": questions,
             "note_id": note_id,
             "subject": note.subject,
-            "tags": json.loads(note.tags) if note.tags else []
+            "tags": note.tags_list
         })
 
+    except TimeoutError:
+        logger.error("AI note generation timed out")
+        return jsonify({"error": "AI note generation timed out"}), 504
+
     except Exception as e:
         logger.exception("AI note generation FAILED")
         return jsonify({
@@ -1903,17 +2805,23 @@ def generate_ai_note(user_id):
 @app.route('/api/notes/<int:note_id>/export', methods=['GET'])
 def export_note(note_id):
     fmt = request.args.get("format", "pdf")
-    note = Note.query.get_or_404(note_id)
-    content_dict = json.loads(note.content)
+    note = db.session.get(Note, note_id, options=[db.load_only(Note.subject, Note.content)]) or abort(404)
+    content_dict = note.content or {}
     summary = content_dict.get("summary", "")
     questions = content_dict.get("questions", "")
 
+    # Render into memory; no temp file to write, re-read and leave behind
+    buf = BytesIO()
     if fmt == "docx":
-        temp = export_note_as_docx(note, summary, questions)
-        return send_file(temp.name, as_attachment=True, download_name=f"{note.subject or 'note'}.docx")
+        export_note_as_docx(note, summary, questions, buf)
+        buf.seek(0)
+        return send_file(buf, as_attachment=True, download_name=f"{note.subject or 'note'}.docx",
+                         mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
     else:
-        temp = export_note_as_pdf(note, summary, questions)
-        return send_file(temp.name, as_attachment=True, download_name=f"{note.subject or 'note'}.pdf")
+        export_note_as_pdf(note, summary, questions, buf)
+        buf.seek(0)
+        return send_file(buf, as_attachment=True, download_name=f"{note.subject or 'note'}.pdf",
+                         mimetype='application/pdf')
 
 @app.route('/api/resources/generate-quiz', methods=['POST'])
 def generate_quiz():
@@ -1989,7 +2897,135 @@ Correct Answer: [Letter]"""
         logger.error(f"Quiz generation error: {str(e)}")
         return jsonify({'error': f'Failed to generate quiz: {str(e)}'}), 500
 
+
+def table_columns(conn, table_name):
+    """Column names of a table; empty when the table doesn't exist yet"""
+    return {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info({table_name})')}
+
+
+def has_unique_index(conn, table_name, columns):
+    """Whether a table has a unique index (or UNIQUE constraint) on exactly these columns"""
+    for index in conn.exec_driver_sql(f'PRAGMA index_list({table_name})'):
+        if index[2] and [
+            row[2] for row in conn.exec_driver_sql(f"PRAGMA index_info('{index[1]}')")
+        ] == list(columns):
+            return True
+    return False
+
+
+def migrate_legacy_assignment_tags(conn):
+    """
+    Move tag lists from the assignments.tags JSON column that predates the
+    assignment_tags table into tags and assignment_tags, then drop the column.
+    """
+    names_by_assignment = []
+    rows = conn.exec_driver_sql(
+        'SELECT id, user_id, tags FROM assignments WHERE tags IS NOT NULL ORDER BY id'
+    )
+    for assignment_id, user_id, tags in rows:
+        try:
+            tag_list = orjson.loads(tags)
+        except orjson.JSONDecodeError:
+            continue
+        if not isinstance(tag_list, list):
+            continue
+        names = [name for name in dict.fromkeys(str(tag).strip() for tag in tag_list) if name]
+        names_by_assignment.append((assignment_id, user_id, names))
+
+    # The first assignment naming a tag becomes its source, as in set_assignments_tags
+    new_tags = {}
+    for assignment_id, user_id, names in names_by_assignment:
+        for name in names:
+            new_tags.setdefault((user_id, name), assignment_id)
+    if new_tags:
+        conn.execute(
+            sqlite_insert(Tag.__table__).on_conflict_do_nothing(index_elements=['user_id', 'name']),
+            [
+                {'user_id': user_id, 'name': name, 'source_assignment_id': assignment_id}
+                for (user_id, name), assignment_id in new_tags.items()
+            ]
+        )
+        tag_ids = {
+            (user_id, name): tag_id
+            for tag_id, user_id, name in conn.exec_driver_sql('SELECT id, user_id, name FROM tags')
+        }
+        links = [
+            {'assignment_id': assignment_id, 'tag_id': tag_ids[(user_id, name)]}
+            for assignment_id, user_id, names in names_by_assignment
+            for name in names
+        ]
+        conn.execute(sqlite_insert(assignment_tags).on_conflict_do_nothing(), links)
+
+    try:
+        conn.exec_driver_sql('ALTER TABLE assignments DROP COLUMN tags')
+    except OperationalError:
+        # SQLite before 3.35 can't drop columns; an all-NULL column is never read again
+        conn.exec_driver_sql('UPDATE assignments SET tags = NULL')
+
+
+def upgrade_database():
+    """
+    Bring a database created by an earlier version of the app up to the current
+    schema, creating any tables that don't exist yet. Every step checks before
+    it changes anything, so this runs on each startup.
+    """
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        # BEGIN IMMEDIATE takes SQLite's write lock up front, so workers starting
+        # together run the upgrade one after another instead of racing
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            # New tables (and their indexes) first; they need no data migration
+            db.metadata.create_all(conn)
+            
+            assignment_columns = table_columns(conn, 'assignments')
+            if assignment_columns and 'updated_at' not in assignment_columns:
+                conn.exec_driver_sql('ALTER TABLE assignments ADD COLUMN updated_at DATETIME')
+                conn.exec_driver_sql('UPDATE assignments SET updated_at = created_at')
+            if assignment_columns and 'due_date_ts' not in assignment_columns:
+                conn.exec_driver_sql('ALTER TABLE assignments ADD COLUMN due_date_ts INTEGER')
+                conn.exec_driver_sql(
+                    "UPDATE assignments SET due_date_ts = CAST(strftime('%s', due_date) AS INTEGER)"
+                )
+            if 'tags' in assignment_columns:
+                migrate_legacy_assignment_tags(conn)
+            # Superseded by ix_assignments_user_due_date_ts once filters moved to due_date_ts
+            conn.exec_driver_sql('DROP INDEX IF EXISTS ix_assignments_user_due_date')
+            
+            if table_columns(conn, 'spaced_repetitions') and not has_unique_index(
+                conn, 'spaced_repetitions', ('user_id', 'note_id')
+            ):
+                # Keep one row per (user, note), the one with the most reviews,
+                # so the unique index the upserts rely on can be built
+                conn.exec_driver_sql(
+                    'DELETE FROM spaced_repetitions WHERE id NOT IN ('
+                    ' SELECT id FROM ('
+                    '  SELECT id, ROW_NUMBER() OVER ('
+                    '   PARTITION BY user_id, note_id ORDER BY COALESCE(revision_count, 0) DESC, id'
+                    '  ) AS row_number FROM spaced_repetitions'
+                    ' ) WHERE row_number = 1'
+                    ')'
+                )
+                conn.exec_driver_sql(
+                    'CREATE UNIQUE INDEX IF NOT EXISTS uq_spaced_repetitions_user_note '
+                    'ON spaced_repetitions (user_id, note_id)'
+                )
+            
+            # create_all only indexes the tables it creates, so add indexes
+            # declared since an existing table was made
+            for table in db.metadata.sorted_tables:
+                if table_columns(conn, table.name):
+                    for index in table.indexes:
+                        index.create(conn, checkfirst=True)
+            conn.exec_driver_sql('COMMIT')
+        except BaseException:
+            conn.exec_driver_sql('ROLLBACK')
+            raise
+
+
+with app.app_context():
+    upgrade_database()
+
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Tables are created by upgrade_database() above.
+    # Development server only; production runs under gunicorn (see gunicorn_conf.py)
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
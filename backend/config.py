@@ -25,7 +25,8 @@ class DevelopmentConfig(Config):
     basedir = os.path.abspath(os.path.dirname(__file__))
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'study_app_dev.db')
-    SQLALCHEMY_ECHO = True
+    # Echoing every statement is slow; opt in with SQL_ECHO=1
+    SQLALCHEMY_ECHO = os.environ.get('SQL_ECHO', '0') == '1'
 
 
 class ProductionConfig(Config):
@@ -1,10 +1,40 @@
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 import random
+import sys
+import threading
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_URL = "http://localhost:5000/api"
 
-SUBJECTS = [
+# One keep-alive connection for every call instead of a new TCP handshake per request.
+# Connection errors and 502/503/504s on idempotent calls are retried with a short backoff.
+session = requests.Session()
+adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.1, status_forcelist=[502, 503, 504]),
+)
+session.mount("http://", adapter)
+session.mount("https://", adapter)
+
+
+def post_json(url, payload):
+    """POST payload encoded with orjson rather than requests' stdlib json encoding"""
+    return session.post(url, data=orjson.dumps(payload), headers={"Content-Type": "application/json"})
+
+
+def post_ndjson(url, items):
+    """POST items as newline-delimited JSON, streamed (chunked) as the iterable produces them"""
+    lines = (orjson.dumps(item) + b"\n" for item in items)
+    return session.post(url, data=lines, headers={"Content-Type": "application/x-ndjson"})
+
+SUBJECTS = (
     "Object Oriented Programming",
     "Computer Vision and Imaging",
     "Security and Networks",
@@ -13,19 +43,23 @@ SUBJECTS = [
     "Web Development",
     "Algorithms and Data Structures",
     "Software Engineering",
-]
+)
+N_SUBJECTS = len(SUBJECTS)
 
 TAGS = {
-    "Object Oriented Programming": ["OOP", "Java", "Python", "Inheritance", "Polymorphism"],
-    "Computer Vision and Imaging": ["CVI", "CNNs", "Image Processing", "OpenCV"],
-    "Security and Networks": ["Security", "Networking", "Encryption", "Protocols"],
-    "Database Systems": ["SQL", "NoSQL", "Database", "PostgreSQL", "MongoDB"],
-    "Machine Learning": ["ML", "Neural Networks", "Deep Learning", "TensorFlow"],
-    "Web Development": ["HTML", "CSS", "JavaScript", "React", "Node.js"],
-    "Algorithms and Data Structures": ["Algorithms", "Data Structures", "Sorting", "Trees"],
-    "Software Engineering": ["SDLC", "Agile", "Testing", "Design Patterns"],
+    "Object Oriented Programming": ("OOP", "Java", "Python", "Inheritance", "Polymorphism"),
+    "Computer Vision and Imaging": ("CVI", "CNNs", "Image Processing", "OpenCV"),
+    "Security and Networks": ("Security", "Networking", "Encryption", "Protocols"),
+    "Database Systems": ("SQL", "NoSQL", "Database", "PostgreSQL", "MongoDB"),
+    "Machine Learning": ("ML", "Neural Networks", "Deep Learning", "TensorFlow"),
+    "Web Development": ("HTML", "CSS", "JavaScript", "React", "Node.js"),
+    "Algorithms and Data Structures": ("Algorithms", "Data Structures", "Sorting", "Trees"),
+    "Software Engineering": ("SDLC", "Agile", "Testing", "Design Patterns"),
 }
 
+# Lowercased subject tags, built once for matching against a user's available tags
+SUBJECT_TAGS_LOWER = {subject: {tag.lower() for tag in tags} for subject, tags in TAGS.items()}
+
 NOTE_TEMPLATES = [
     "Key concepts include {concepts}",
     "Important topics: {concepts}",
@@ -34,32 +68,103 @@ NOTE_TEMPLATES = [
     "Core principles: {concepts}",
 ]
 
+
+def _compile_template(template):
+    """Split a template on its single {concepts} field so filling it is plain concatenation"""
+    prefix, _, suffix = template.partition("{concepts}")
+    return lambda concepts: prefix + concepts + suffix
+
+
+# Same order as NOTE_TEMPLATES, so a seeded rng picks the same template as before
+NOTE_TEMPLATE_FNS = tuple(_compile_template(t) for t in NOTE_TEMPLATES)
+
+# Per-thread output buffer so users set up in parallel don't interleave their lines
+_output = threading.local()
+
+
+def log(message):
+    """Print a line, or collect it in the current worker's buffer when one is active"""
+    lines = getattr(_output, 'lines', None)
+    if lines is None:
+        print(message)
+    else:
+        lines.append(message)
+
+
+def write_lines(lines):
+    """Write buffered lines to stdout with a single write and flush"""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+HEALTH_CACHE_FILE = Path.home() / ".cache" / "gdg_health.json"
+
+
+def is_api_up(ttl=10.0, deadline=5.0):
+    """
+    Check GET /health, skipping the call if it succeeded for this BASE_URL
+    within the last ttl seconds (handy when rerunning the script in a loop).
+    While the server is still starting, connection attempts are retried with
+    exponential backoff for up to deadline seconds; after that the
+    requests.exceptions.ConnectionError is raised.
+    """
+    try:
+        if time.time() - HEALTH_CACHE_FILE.stat().st_mtime < ttl:
+            if orjson.loads(HEALTH_CACHE_FILE.read_bytes()).get("base_url") == BASE_URL:
+                return True
+    except (OSError, orjson.JSONDecodeError):
+        pass
+
+    started = time.monotonic()
+    delay = 0.05
+    while True:
+        try:
+            response = session.get(f"{BASE_URL}/health", timeout=1.0)
+            break
+        except requests.exceptions.ConnectionError:
+            if time.monotonic() - started + delay > deadline:
+                raise
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    if response.status_code != 200:
+        return False
+
+    try:
+        HEALTH_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        HEALTH_CACHE_FILE.write_bytes(orjson.dumps({"base_url": BASE_URL}))
+    except OSError:
+        pass
+    return True
+
+
 def create_sample_users(count=3):
     """Create sample users"""
-    users = []
-
-    for i in range(count):
-        user_data = {
+    batch = [
+        {
             "microsoft_id": f"ms_user_{i+1}",
             "email": f"student{i+1}@university.edu",
             "display_name": f"Student {i+1}",
         }
+        for i in range(count)
+    ]
 
-        response = requests.post(f"{BASE_URL}/users", json=user_data)
+    # All users go in one request; ones that already exist come back as skipped
+    response = post_json(f"{BASE_URL}/users/batch", {"users": batch})
 
-        if response.status_code in [200, 201]:
-            user = response.json()
-            users.append(user)
-            print(f"✓ Created user: {user['email']}")
-        elif response.status_code == 409:
-            # User already exists, try to get them
-            print(f"  ⚠ User {user_data['email']} already exists, skipping...")
-        else:
-            print(f"✗ Failed to create user: {response.text}")
+    if response.status_code != 201:
+        print(f"✗ Failed to create users: {response.text}")
+        return []
 
-    return users
+    result = orjson.loads(response.content)
+    lines = [f"✓ Created user: {user['email']}" for user in result["created"]]
+    lines.extend(f"  ⚠ User {microsoft_id} already exists, skipping..." for microsoft_id in result["skipped"])
+    if lines:
+        write_lines(lines)
 
-def create_sample_assignments(user_id, count=8):
+    return result["created"]
+
+def create_sample_assignments(user_id, count=8, rng=random):
     """
     Create assignments using the API.
     
@@ -74,8 +179,6 @@ def create_sample_assignments(user_id, count=8):
     ✔ weight
     """
 
-    assignments = []
-
     assignment_templates = [
         ("Final Exam", 45, 40, True),      
         ("Midterm Project", 30, 25, True),
@@ -87,38 +190,42 @@ def create_sample_assignments(user_id, count=8):
         ("Homework", 5, 10, False),
     ]
 
-    for i in range(min(count, len(assignment_templates))):
-        template_name, days_ahead, weight, has_grade = assignment_templates[i]
+    # One reference time so every due date in the batch is relative to the same instant
+    base_now = datetime.now()
 
-        subject = SUBJECTS[i % len(SUBJECTS)]
-        subject_tags = TAGS[subject]
+    def build_assignments():
+        for i in range(min(count, len(assignment_templates))):
+            template_name, days_ahead, weight, has_grade = assignment_templates[i]
 
-        selected_tags = random.sample(subject_tags, min(3, len(subject_tags)))
+            subject = SUBJECTS[i % N_SUBJECTS]
+            subject_tags = TAGS[subject]
 
-        assignment_data = {
-            "name": f"{subject} - {template_name}",
-            "due_date": (datetime.now() + timedelta(days=days_ahead)).isoformat(),
-            "tags": selected_tags,
-            "weight": weight,
-        }
-        
+            selected_tags = rng.sample(subject_tags, min(3, len(subject_tags)))
 
-        if has_grade:
-            assignment_data["grade"] = random.randint(70, 100)
+            assignment_data = {
+                "name": f"{subject} - {template_name}",
+                "due_date": (base_now + timedelta(days=days_ahead)).isoformat(),
+                "tags": selected_tags,
+                "weight": weight,
+            }
 
-        response = requests.post(
-            f"{BASE_URL}/assignments/user/{user_id}",
-            json=assignment_data,
-        )
+            if has_grade:
+                assignment_data["grade"] = rng.randint(70, 100)
 
-        if response.status_code == 201:
-            assignment = response.json()
-            assignments.append(assignment)
-            grade_str = f", grade={assignment_data.get('grade', 'N/A')}" if has_grade else ""
-            print(f"  ✓ Created assignment: {assignment['name']} (weight={weight}%{grade_str})")
-            print(f"    Tags registered: {selected_tags}")
-        else:
-            print(f"  ✗ Failed to create assignment: {response.text}")
+            yield assignment_data
+
+    # All assignments go in one streamed request and one commit
+    response = post_ndjson(f"{BASE_URL}/assignments/user/{user_id}/batch", build_assignments())
+
+    if response.status_code != 201:
+        log(f"  ✗ Failed to create assignments: {response.text}")
+        return []
+
+    assignments = orjson.loads(response.content)
+    for assignment in assignments:
+        grade_str = f", grade={assignment['grade']}" if assignment.get('grade') is not None else ""
+        log(f"  ✓ Created assignment: {assignment['name']} (weight={assignment['weight']}%{grade_str})")
+        log(f"    Tags registered: {assignment['tags']}")
 
     return assignments
 
@@ -126,105 +233,109 @@ def create_sample_assignments(user_id, count=8):
 def get_available_tags(user_id):
     """Get all available tags for a user (created from assignments)"""
     
-    response = requests.get(f"{BASE_URL}/tags/user/{user_id}/names")
+    response = session.get(f"{BASE_URL}/tags/user/{user_id}/names")
     
     if response.status_code == 200:
-        result = response.json()
+        result = orjson.loads(response.content)
         return result.get('tags', [])
     else:
-        print(f"  ✗ Failed to get tags: {response.text}")
+        log(f"  ✗ Failed to get tags: {response.text}")
         return []
 
 
 def sync_tags_from_assignments(user_id):
     """Sync tags from existing assignments (useful for retroactive tag creation)"""
     
-    response = requests.post(f"{BASE_URL}/tags/user/{user_id}/sync")
+    response = session.post(f"{BASE_URL}/tags/user/{user_id}/sync")
     
     if response.status_code == 200:
-        result = response.json()
-        print(f"  ✓ Tags synced: {result['total_tags']} total tags")
+        result = orjson.loads(response.content)
+        log(f"  ✓ Tags synced: {result['total_tags']} total tags")
         if result['new_tags_created']:
-            print(f"    New tags created: {result['new_tags_created']}")
+            log(f"    New tags created: {result['new_tags_created']}")
         return result['all_tags']
     else:
-        print(f"  ✗ Failed to sync tags: {response.text}")
+        log(f"  ✗ Failed to sync tags: {response.text}")
         return []
 
 
 def show_available_tags(user_id):
     """Display all available tags for a user"""
     
-    response = requests.get(f"{BASE_URL}/tags/user/{user_id}")
+    response = session.get(f"{BASE_URL}/tags/user/{user_id}")
     
     if response.status_code == 200:
-        tags = response.json()
-        print(f"  📏 Available tags ({len(tags)} total):")
+        tags = orjson.loads(response.content)
+        log(f"  📏 Available tags ({len(tags)} total):")
         for tag in tags:
             source = f" (from assignment #{tag['source_assignment_id']})" if tag['source_assignment_id'] else ""
-            print(f"    - {tag['name']}{source}")
+            log(f"    - {tag['name']}{source}")
         return tags
     else:
-        print(f"  ✗ Failed to get tags: {response.text}")
+        log(f"  ✗ Failed to get tags: {response.text}")
         return []
 
 
-def create_sample_notes(user_id, count=10):
+def create_sample_notes(user_id, count=10, available_tags=None, rng=random):
     """
     Create sample notes for a user.
     
     IMPORTANT: Notes can only use tags that exist from assignments.
-    This function first fetches available tags, then creates notes
-    using only those valid tags.
+    This function first fetches available tags (unless the caller already
+    has them), then creates notes using only those valid tags.
     """
     
-    available_tags = get_available_tags(user_id)
+    if available_tags is None:
+        available_tags = get_available_tags(user_id)
     
     if not available_tags:
-        print("  ⚠ No tags available. Create assignments first!")
+        log("  ⚠ No tags available. Create assignments first!")
         return []
+    available_tags = tuple(available_tags)
     
-    print(f"  📏 Using {len(available_tags)} available tags: {available_tags[:5]}{'...' if len(available_tags) > 5 else ''}")
+    log(f"  📏 Using {len(available_tags)} available tags: {available_tags[:5]}{'...' if len(available_tags) > 5 else ''}")
     
-    notes = []
-
-    for i in range(count):
-        subject = random.choice(SUBJECTS)
-        
-        subject_related_tags = [t for t in available_tags if any(
-            t.lower() in tag.lower() or tag.lower() in t.lower() 
-            for tag in TAGS.get(subject, [])
-        )]
-        
-        if not subject_related_tags:
-            subject_related_tags = available_tags
-        
-        num_tags = min(random.randint(1, 3), len(subject_related_tags))
-        selected_tags = random.sample(subject_related_tags, num_tags)
-        
-        concepts = ", ".join(selected_tags)
-        content_text = random.choice(NOTE_TEMPLATES).format(concepts=concepts)
-
-        note_data = {
-            "content": {
-                "title": f"{subject} - Note {i+1}",
-                "body": content_text + f"\n\nSummary of {subject} concepts.\nExample {i+1} for {subject}.",
-            },
-            "subject": subject,
-            "tags": selected_tags,
-        }
+    # Tags related to each subject, matched once up front instead of per note.
+    # Exact matches are a set lookup; only the rest fall back to substring checks.
+    lowered_available = [(t, t.lower()) for t in available_tags]
+    related_by_subject = {}
+    for subject in SUBJECTS:
+        subject_tags = SUBJECT_TAGS_LOWER.get(subject, set())
+        related_by_subject[subject] = tuple(
+            t for t, tl in lowered_available
+            if tl in subject_tags or any(tl in tag_l or tag_l in tl for tag_l in subject_tags)
+        ) or available_tags
+    
+    def build_notes():
+        for i in range(count):
+            subject = rng.choice(SUBJECTS)
+            subject_related_tags = related_by_subject[subject]
+
+            num_tags = min(rng.randint(1, 3), len(subject_related_tags))
+            selected_tags = rng.sample(subject_related_tags, num_tags)
+
+            concepts = ", ".join(selected_tags)
+            content_text = rng.choice(NOTE_TEMPLATE_FNS)(concepts)
+
+            yield {
+                "content": {
+                    "title": f"{subject} - Note {i+1}",
+                    "body": content_text + f"\n\nSummary of {subject} concepts.\nExample {i+1} for {subject}.",
+                },
+                "subject": subject,
+                "tags": selected_tags,
+            }
+
+    # All notes go in one streamed request and one commit
+    response = post_ndjson(f"{BASE_URL}/users/{user_id}/notes/batch", build_notes())
+
+    if response.status_code != 201:
+        log(f"  ✗ Failed to create notes: {response.text}")
+        return []
 
-        response = requests.post(
-            f"{BASE_URL}/users/{user_id}/notes",
-            json=note_data,
-        )
-
-        if response.status_code == 201:
-            note = response.json()
-            notes.append(note)
-            print(f"  ✓ Created note: {note['subject']} (tags: {selected_tags})")
-        else:
-            print(f"  ✗ Failed to create note: {response.text}")
+    notes = orjson.loads(response.content)
+    for note in notes:
+        log(f"  ✓ Created note: {note['subject']} (tags: {note['tags']})")
 
     return notes
 
@@ -232,18 +343,44 @@ def create_sample_notes(user_id, count=10):
 def check_weighted_grade(user_id):
     """Call the weighted grade endpoint"""
 
-    response = requests.get(
+    response = session.get(
         f"{BASE_URL}/assignments/user/{user_id}/weighted-grade"
     )
 
     if response.status_code == 200:
-        result = response.json()
+        result = orjson.loads(response.content)
         if result['weighted_grade'] is not None:
-            print(f"Weighted Grade: {result['weighted_grade']}%")
+            log(f"Weighted Grade: {result['weighted_grade']}%")
         else:
-            print(f"Weighted Grade: No graded assignments yet")
+            log(f"Weighted Grade: No graded assignments yet")
     else:
-        print(f"  ✗ Failed weighted grade check: {response.text}")
+        log(f"  ✗ Failed weighted grade check: {response.text}")
+
+
+def _setup_one_user(user):
+    """Create one user's assignments and notes; returns the lines it logged"""
+    _output.lines = [f"\n Setting up data for {user['display_name']}..."]
+    # Each worker draws from its own generator (no shared-state contention), seeded
+    # by user id so a rerun against a fresh database produces the same data
+    rng = random.Random(user["id"])
+    try:
+        log("Creating assignments (this registers tags)...")
+        assignments = create_sample_assignments(user["id"], count=8, rng=rng)
+
+        log("Checking available tags...")
+        tags = show_available_tags(user["id"])
+
+        # Reuse the tags just listed rather than fetching the names again
+        log("Creating notes (using valid tags)...")
+        create_sample_notes(user["id"], count=10, available_tags=[tag['name'] for tag in tags], rng=rng)
+
+        # A new user only has grades if one of the assignments just created had one
+        if any(assignment.get('grade') is not None for assignment in assignments):
+            log("Checking weighted grade...")
+            check_weighted_grade(user["id"])
+        return _output.lines
+    finally:
+        del _output.lines
 
 
 def generate_all_sample_data():
@@ -267,20 +404,10 @@ def generate_all_sample_data():
         print("No users created. Make sure Flask is running.")
         return
 
-    for user in users:
-        print(f"\n Setting up data for {user['display_name']}...")
-
-        print("Creating assignments (this registers tags)...")
-        create_sample_assignments(user["id"], count=8)
-
-        print("Checking available tags...")
-        show_available_tags(user["id"])
-
-        print("Creating notes (using valid tags)...")
-        create_sample_notes(user["id"], count=10)
-
-        print("Checking weighted grade...")
-        check_weighted_grade(user["id"])
+    # Users are independent, so set them up concurrently and print each one's log in order
+    with ThreadPoolExecutor(max_workers=min(8, len(users))) as executor:
+        for lines in executor.map(_setup_one_user, users):
+            write_lines(lines)
 
     print("\n" + "=" * 60)
     print("Sample data generation complete!")
@@ -290,31 +417,30 @@ def generate_all_sample_data():
 def generate_for_existing_user(user_id):
     """Generate sample data for an existing user"""
     
-    print(f"Generating data for user ID: {user_id}")
-    
-    print("Syncing existing tags...")
-    sync_tags_from_assignments(user_id)
-    
-    print("\n  📋 Creating assignments...")
-    create_sample_assignments(user_id, count=5)
-    
-    print("\n  🏷️  Available tags:")
-    show_available_tags(user_id)
-    
-    print("\n  📚 Creating notes...")
-    create_sample_notes(user_id, count=8)
+    _output.lines = [f"Generating data for user ID: {user_id}"]
+    try:
+        log("Syncing existing tags...")
+        sync_tags_from_assignments(user_id)
+        
+        log("\n  📋 Creating assignments...")
+        create_sample_assignments(user_id, count=5)
+        
+        log("\n  🏷️  Available tags:")
+        tags = show_available_tags(user_id)
+        
+        log("\n  📚 Creating notes...")
+        create_sample_notes(user_id, count=8, available_tags=[tag['name'] for tag in tags])
 
-    print("\n  📊 Weighted grade:")
-    check_weighted_grade(user_id)
+        log("\n  📊 Weighted grade:")
+        check_weighted_grade(user_id)
+    finally:
+        write_lines(_output.lines)
+        del _output.lines
 
 
 if __name__ == "__main__":
-    import sys
-    
     try:
-        response = requests.get(f"{BASE_URL}/health")
-
-        if response.status_code == 200:
+        if is_api_up():
             if len(sys.argv) > 1:
                 try:
                     user_id = int(sys.argv[1])
@@ -3,17 +3,175 @@ Microsoft Graph API Service
 Handles all Microsoft Teams and To Do API calls
 """
 
+import hashlib
+import os
+import threading
+import time
+import msal
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, List, Optional, Any
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from urllib.parse import quote, urlencode
 from microsoft_config import MicrosoftConfig
 
 
+class _GraphRetry(Retry):
+    """Retry idempotent calls on 429/5xx, and any call on 429
+    
+    A throttled request was rejected before Graph acted on it, so replaying a
+    POST/PATCH after Retry-After is safe; a 5xx write may have been applied and
+    is left to the caller.
+    """
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and self.total:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+# Shared across requests so Graph calls reuse pooled keep-alive TLS connections
+# instead of a fresh handshake per call; auth headers are passed per request.
+_http = requests.Session()
+_http.mount('https://', HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=_GraphRetry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                            respect_retry_after_header=True, raise_on_status=False),
+))
+
+def prewarm_connections():
+    """Open pooled connections to Graph and the login authority in the background
+    
+    DNS and the TLS handshake are paid here at startup rather than by the first
+    user request; failures are ignored since real calls will retry anyway.
+    """
+    def warm():
+        for url in (MicrosoftConfig.GRAPH_API_ENDPOINT, MicrosoftConfig.AUTHORITY):
+            try:
+                _http.head(url, timeout=GRAPH_TIMEOUT)
+            except requests.exceptions.RequestException:
+                pass
+    
+    threading.Thread(target=warm, name='graph-prewarm', daemon=True).start()
+
+
+GRAPH_METHODS = frozenset(('GET', 'POST', 'PATCH', 'DELETE'))
+
+# (connect, read) seconds; without one a stalled Graph call holds a worker forever
+GRAPH_TIMEOUT = (5, 30)
+
+
+class GraphUnavailableError(Exception):
+    """Raised without calling Graph while the circuit breaker is open"""
+
+
+class _CircuitBreaker:
+    """Fail fast for reset_timeout seconds after fail_max consecutive Graph outages
+    
+    Only connection failures and 5xx count: 4xx (including per-token 429s) mean
+    Graph itself is up. After the timeout the circuit is half-open: a single probe
+    call is let through while the rest keep failing fast. A successful probe
+    closes the circuit; a failed one reopens it straight away. A probe that never
+    reports back (an uncounted error) is replaced after another reset_timeout.
+    """
+    def __init__(self, fail_max: int, reset_timeout: float):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+    
+    def check(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            now = time.monotonic()
+            probe_running = (
+                self._probe_started_at is not None
+                and now - self._probe_started_at < self.reset_timeout
+            )
+            if now - self._opened_at < self.reset_timeout or probe_running:
+                raise GraphUnavailableError("Microsoft Graph is unavailable; try again shortly")
+            self._probe_started_at = now
+    
+    def record(self, success: bool):
+        with self._lock:
+            self._probe_started_at = None
+            if success:
+                self._failures = 0
+                self._opened_at = None
+            elif self._opened_at is not None:
+                # The half-open probe failed
+                self._opened_at = time.monotonic()
+            else:
+                self._failures += 1
+                if self._failures >= self.fail_max:
+                    self._opened_at = time.monotonic()
+
+
+_breaker = _CircuitBreaker(fail_max=10, reset_timeout=30)
+
+
+GRAPH_CACHE_SIZE = 4096
+# (token key, method name, args) -> (expires_at, result), least recently used first
+_graph_cache = OrderedDict()
+_graph_cache_lock = threading.Lock()
+
+
+def cached_get(ttl):
+    """Cache a read-only GraphAPIService method per access token for ttl seconds"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args):
+            key = (self.token_key, func.__name__, args)
+            with _graph_cache_lock:
+                entry = _graph_cache.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    _graph_cache.move_to_end(key)
+                    return entry[1]
+            
+            result = func(self, *args)
+            
+            with _graph_cache_lock:
+                _graph_cache[key] = (time.monotonic() + ttl, result)
+                _graph_cache.move_to_end(key)
+                if len(_graph_cache) > GRAPH_CACHE_SIZE:
+                    _graph_cache.popitem(last=False)
+            return result
+        return wrapper
+    return decorator
+
+
+def invalidate_graph_cache(token_key):
+    """Drop every cached read made with this token (after it changes something)"""
+    with _graph_cache_lock:
+        for key in [key for key in _graph_cache if key[0] == token_key]:
+            del _graph_cache[key]
+
+
+# Optional create_task fields and how each maps onto Graph's todoTask shape
+TASK_FIELD_MAP = (
+    ('body', lambda value: {'content': value, 'contentType': 'text'}),
+    ('dueDateTime', lambda value: {'dateTime': value, 'timeZone': 'UTC'}),
+    ('reminderDateTime', lambda value: {'dateTime': value, 'timeZone': 'UTC'}),
+    ('importance', lambda value: value),
+    ('isReminderOn', lambda value: value),
+)
+
+
 class GraphAPIService:
     """Service class for Microsoft Graph API operations"""
     
     def __init__(self, access_token: str):
         self.access_token = access_token
+        # Cache key for this token; the raw token is never kept in the cache
+        self.token_key = hashlib.sha1(access_token.encode()).hexdigest()[:16]
         self.headers = {
             'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/json'
@@ -23,36 +181,96 @@ class GraphAPIService:
     def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
         """Make HTTP request to Graph API"""
         url = f"{self.base_url}/{endpoint}"
+        if method not in GRAPH_METHODS:
+            raise ValueError(f"Unsupported HTTP method: {method}")
+        _breaker.check()
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=self.headers)
-            elif method == 'POST':
-                response = requests.post(url, headers=self.headers, json=data)
-            elif method == 'PATCH':
-                response = requests.patch(url, headers=self.headers, json=data)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=self.headers)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
+            # Bodies are encoded with orjson; self.headers already carries the JSON content type
+            body = orjson.dumps(data) if data is not None else None
+            response = _http.request(method, url, headers=self.headers, data=body, timeout=GRAPH_TIMEOUT)
             
+            _breaker.record(response.status_code < 500)
             response.raise_for_status()
             
+            if method != 'GET':
+                invalidate_graph_cache(self.token_key)
+            
             if response.status_code == 204:
                 return {'success': True}
             
-            return response.json()
+            return orjson.loads(response.content)
         
         except requests.exceptions.RequestException as e:
+            if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                _breaker.record(False)
             print(f"Graph API Error: {e}")
             if hasattr(e.response, 'text'):
                 print(f"Response: {e.response.text}")
             raise
     
+    def _map(self, calls: List[tuple], workers: int = 10) -> List[Dict]:
+        """Run independent (method, endpoint[, data]) requests concurrently, results in call order
+        
+        Workers are capped at 10 per call to stay within Graph's per-token throttling
+        guidance; 429s are retried by the session's adapter.
+        """
+        if len(calls) <= 1:
+            return [self._make_request(*call) for call in calls]
+        with ThreadPoolExecutor(max_workers=min(workers, len(calls))) as executor:
+            return list(executor.map(lambda call: self._make_request(*call), calls))
+    
+    # Graph accepts at most 20 requests per $batch call
+    MAX_BATCH_SIZE = 20
+    
+    def batch(self, steps: List[Dict]) -> List[Dict]:
+        """Send several Graph requests through JSON $batch, 20 per round trip
+        
+        Args:
+            steps: List of dicts with 'method', 'url' (relative to the API root,
+                   e.g. 'me/chats') and optional 'body'
+        
+        Returns:
+            One {'status': int, 'body': dict} per step, in the same order
+        """
+        results = []
+        for start in range(0, len(steps), self.MAX_BATCH_SIZE):
+            chunk = steps[start:start + self.MAX_BATCH_SIZE]
+            batch_requests = []
+            for i, step in enumerate(chunk):
+                entry = {'id': str(i), 'method': step['method'], 'url': '/' + step['url'].lstrip('/')}
+                if step.get('body') is not None:
+                    entry['body'] = step['body']
+                    entry['headers'] = {'Content-Type': 'application/json'}
+                batch_requests.append(entry)
+            
+            result = self._make_request('POST', '$batch', {'requests': batch_requests})
+            # Responses may come back in any order; match them up by id
+            by_id = {r['id']: r for r in result.get('responses', [])}
+            for i in range(len(chunk)):
+                response = by_id.get(str(i), {})
+                results.append({'status': response.get('status', 502), 'body': response.get('body') or {}})
+        return results
+    
+    def get_dashboard(self) -> Dict:
+        """Get chats, joined teams and To Do lists in a single $batch call"""
+        urls = ['me/chats', 'me/joinedTeams', 'me/todo/lists']
+        responses = self.batch([{'method': 'GET', 'url': url} for url in urls])
+        
+        for url, response in zip(urls, responses):
+            if response['status'] >= 400:
+                message = response['body'].get('error', {}).get('message', '')
+                raise Exception(f"Graph API error {response['status']} for {url}: {message}")
+        
+        chats, teams, todo_lists = (response['body'].get('value', []) for response in responses)
+        return {'chats': chats, 'teams': teams, 'todo_lists': todo_lists}
+    
+    @cached_get(ttl=300)
     def get_user_profile(self) -> Dict:
         """Get current user's profile"""
         return self._make_request('GET', 'me')
     
+    @cached_get(ttl=15)
     def get_user_presence(self, user_id: str) -> Dict:
         """Get user's presence status (online/offline/busy)"""
         return self._make_request('GET', f'users/{user_id}/presence')
@@ -62,6 +280,18 @@ class GraphAPIService:
         result = self._make_request('GET', 'me/chats')
         return result.get('value', [])
     
+    def get_recent_chat_messages(self, chat_count: int = 5, limit: int = 20) -> List[Dict]:
+        """Get the latest messages from each of the most recent chats, fetched concurrently"""
+        chats = self.get_chats()[:chat_count]
+        results = self._map([
+            ('GET', f'me/chats/{chat["id"]}/messages?$top={limit}&$orderby=createdDateTime desc')
+            for chat in chats
+        ])
+        return [
+            {'chat_id': chat['id'], 'topic': chat.get('topic'), 'messages': result.get('value', [])}
+            for chat, result in zip(chats, results)
+        ]
+    
     def get_chat_messages(self, chat_id: str, limit: int = 50) -> List[Dict]:
         """Get messages from a specific chat"""
         endpoint = f'me/chats/{chat_id}/messages?$top={limit}&$orderby=createdDateTime desc'
@@ -99,6 +329,7 @@ class GraphAPIService:
         
         return chat
     
+    @cached_get(ttl=120)
     def get_teams(self) -> List[Dict]:
         """Get all teams the user is a member of"""
         result = self._make_request('GET', 'me/joinedTeams')
@@ -109,15 +340,39 @@ class GraphAPIService:
         result = self._make_request('GET', f'teams/{team_id}/members')
         return result.get('value', [])
     
+    def get_team_members_presence(self, team_id: str) -> List[Dict]:
+        """Get every team member with their presence, presence lookups made concurrently"""
+        members = [m for m in self.get_team_members(team_id) if m.get('userId')]
+        presences = self._map([('GET', f"users/{m['userId']}/presence") for m in members])
+        return [
+            {
+                'user_id': member['userId'],
+                'display_name': member.get('displayName'),
+                'availability': presence.get('availability'),
+                'activity': presence.get('activity'),
+            }
+            for member, presence in zip(members, presences)
+        ]
+    
+    @cached_get(ttl=30)
     def search_users(self, search_query: str) -> List[Dict]:
         """Search for users (e.g., professors)"""
-        endpoint = f"users?$filter=startswith(displayName,'{search_query}') or startswith(mail,'{search_query}')&$top=10"
+        # OData string literals escape a quote by doubling it
+        q = search_query.replace("'", "''")
+        params = {
+            '$filter': f"startswith(displayName,'{q}') or startswith(mail,'{q}')",
+            '$top': '10',
+            '$select': 'id,displayName,mail,userPrincipalName,jobTitle',
+        }
+        endpoint = 'users?' + urlencode(params, safe='$,', quote_via=quote)
         result = self._make_request('GET', endpoint)
         return result.get('value', [])
     
+    @cached_get(ttl=60)
     def get_todo_lists(self) -> List[Dict]:
         """Get all To Do task lists"""
-        result = self._make_request('GET', 'me/todo/lists')
+        # Only the fields the TodoList model returns
+        result = self._make_request('GET', 'me/todo/lists?$select=id,displayName,isOwner')
         return result.get('value', [])
     
     def create_todo_list(self, name: str) -> Dict:
@@ -127,7 +382,9 @@ class GraphAPIService:
     
     def get_tasks(self, list_id: str) -> List[Dict]:
         """Get all tasks from a specific list"""
-        result = self._make_request('GET', f'me/todo/lists/{list_id}/tasks')
+        # Only the fields the Task model returns
+        endpoint = f'me/todo/lists/{list_id}/tasks?$select=id,title,status,importance,dueDateTime,isReminderOn&$top=200'
+        result = self._make_request('GET', endpoint)
         return result.get('value', [])
     
     def create_task(self, list_id: str, task_data: Dict) -> Dict:
@@ -144,28 +401,9 @@ class GraphAPIService:
                 - isReminderOn: bool (optional)
         """
         data = {'title': task_data['title']}
-        
-        if 'body' in task_data:
-            data['body'] = {'content': task_data['body'], 'contentType': 'text'}
-        
-        if 'dueDateTime' in task_data:
-            data['dueDateTime'] = {
-                'dateTime': task_data['dueDateTime'],
-                'timeZone': 'UTC'
-            }
-        
-        if 'reminderDateTime' in task_data:
-            data['reminderDateTime'] = {
-                'dateTime': task_data['reminderDateTime'],
-                'timeZone': 'UTC'
-            }
-        
-        if 'importance' in task_data:
-            data['importance'] = task_data['importance']
-        
-        if 'isReminderOn' in task_data:
-            data['isReminderOn'] = task_data['isReminderOn']
-        
+        data.update(
+            (key, to_graph(task_data[key])) for key, to_graph in TASK_FIELD_MAP if key in task_data
+        )
         return self._make_request('POST', f'me/todo/lists/{list_id}/tasks', data)
     
     def update_task(self, list_id: str, task_id: str, updates: Dict) -> Dict:
@@ -177,30 +415,97 @@ class GraphAPIService:
         updates = {'status': 'completed'}
         return self.update_task(list_id, task_id, updates)
     
+    def bulk_update_tasks(self, list_id: str, items: List[tuple]) -> List[Dict]:
+        """Apply (task_id, updates) pairs to a list's tasks through $batch
+        
+        Returns:
+            One {'task_id', 'status', 'body'} per item, in the same order
+        """
+        responses = self.batch([
+            {'method': 'PATCH', 'url': f'me/todo/lists/{list_id}/tasks/{task_id}', 'body': updates}
+            for task_id, updates in items
+        ])
+        return [
+            {'task_id': task_id, 'status': response['status'], 'body': response['body']}
+            for (task_id, _), response in zip(items, responses)
+        ]
+    
     def delete_task(self, list_id: str, task_id: str) -> Dict:
         """Delete a task"""
         return self._make_request('DELETE', f'me/todo/lists/{list_id}/tasks/{task_id}')
 
 
+# One MSAL token cache shared by every auth call in this process and persisted
+# to disk, so refreshes can be answered from cached tokens instead of Entra ID
+_token_cache = msal.SerializableTokenCache()
+_token_cache_lock = threading.Lock()
+try:
+    with open(MicrosoftConfig.TOKEN_CACHE_FILE) as f:
+        _token_cache.deserialize(f.read())
+except (OSError, ValueError):
+    pass
+
+
+def _save_token_cache():
+    """Write the token cache back to disk if the last MSAL call changed it"""
+    with _token_cache_lock:
+        if not _token_cache.has_state_changed:
+            return
+        path = MicrosoftConfig.TOKEN_CACHE_FILE
+        tmp_path = f"{path}.tmp"
+        # Holds refresh tokens, so keep it readable by this user only
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(_token_cache.serialize())
+        os.replace(tmp_path, path)
+        _token_cache.has_state_changed = False
+
+
+_msal_app = None
+_msal_app_lock = threading.Lock()
+
+
+def get_msal_app() -> msal.ConfidentialClientApplication:
+    """The process-wide MSAL client, built once (authority discovery included) on first use"""
+    global _msal_app
+    if _msal_app is None:
+        with _msal_app_lock:
+            if _msal_app is None:
+                _msal_app = msal.ConfidentialClientApplication(
+                    MicrosoftConfig.CLIENT_ID,
+                    authority=MicrosoftConfig.AUTHORITY,
+                    client_credential=MicrosoftConfig.CLIENT_SECRET,
+                    token_cache=_token_cache,
+                    # Token calls share the pooled, prewarmed session with Graph calls
+                    http_client=_http
+                )
+    return _msal_app
+
+
+def _account_for_refresh_token(msal_app, refresh_token: str) -> Optional[Dict]:
+    """Find the cached account a refresh token was issued to, if MSAL has seen it"""
+    for item in _token_cache.search(msal.TokenCache.CredentialType.REFRESH_TOKEN):
+        if item.get('secret') == refresh_token:
+            for account in msal_app.get_accounts():
+                if account.get('home_account_id') == item.get('home_account_id'):
+                    return account
+    return None
+
+
 class TokenManager:
     """Manages access token refresh and storage"""
     
     @staticmethod
     def get_token_from_code(auth_code: str) -> Dict:
         """Exchange authorization code for access token"""
-        import msal
-        
-        msal_app = msal.ConfidentialClientApplication(
-            MicrosoftConfig.CLIENT_ID,
-            authority=MicrosoftConfig.AUTHORITY,
-            client_credential=MicrosoftConfig.CLIENT_SECRET
-        )
+        msal_app = get_msal_app()
         
         result = msal_app.acquire_token_by_authorization_code(
             auth_code,
             scopes=MicrosoftConfig.SCOPES,
             redirect_uri=MicrosoftConfig.REDIRECT_URI
         )
+        _save_token_cache()
         
         if 'access_token' in result:
             return {
@@ -215,23 +520,25 @@ class TokenManager:
     @staticmethod
     def refresh_token(refresh_token: str) -> Dict:
         """Refresh an expired access token"""
-        import msal
+        msal_app = get_msal_app()
         
-        msal_app = msal.ConfidentialClientApplication(
-            MicrosoftConfig.CLIENT_ID,
-            authority=MicrosoftConfig.AUTHORITY,
-            client_credential=MicrosoftConfig.CLIENT_SECRET
-        )
-        
-        result = msal_app.acquire_token_by_refresh_token(
-            refresh_token,
-            scopes=MicrosoftConfig.SCOPES
-        )
+        # A still-valid cached access token for this account needs no network call
+        result = None
+        account = _account_for_refresh_token(msal_app, refresh_token)
+        if account:
+            result = msal_app.acquire_token_silent(MicrosoftConfig.SCOPES, account=account)
+        if not result:
+            result = msal_app.acquire_token_by_refresh_token(
+                refresh_token,
+                scopes=MicrosoftConfig.SCOPES
+            )
+        _save_token_cache()
         
         if 'access_token' in result:
             return {
                 'access_token': result['access_token'],
-                'refresh_token': result.get('refresh_token'),
+                # Cache hits don't return a refresh token; the caller's one is still valid
+                'refresh_token': result.get('refresh_token', refresh_token),
                 'expires_in': result.get('expires_in')
             }
         else:
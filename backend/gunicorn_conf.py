@@ -0,0 +1,19 @@
+# Gunicorn settings: gunicorn -c gunicorn_conf.py app:app
+import os
+
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:5000')
+
+# Threaded workers: most request time is spent waiting on SQLite, file I/O and
+# OpenAI, so each process serves several requests at once. For many concurrent
+# Graph/OpenAI callers set GUNICORN_WORKER_CLASS=gevent (pip install gevent);
+# gunicorn monkey-patches the stdlib before loading the app, so requests and
+# the AI worker pool become cooperative without code changes.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('GUNICORN_WORKERS', 2 * (os.cpu_count() or 1) + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+# Concurrent greenlets per worker; only used by the gevent/eventlet classes
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Longer than the 60s AI call timeout so slow completions finish cleanly
+timeout = 120
+keepalive = 5
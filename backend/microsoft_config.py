@@ -4,7 +4,8 @@ Handles authentication and API configuration for Teams integration
 """
 
 import os
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Any, Mapping
 
 class MicrosoftConfig:
     """Configuration for Microsoft Graph API"""
@@ -18,6 +19,10 @@ class MicrosoftConfig:
     AUTHORITY = f'https://login.microsoftonline.com/{TENANT_ID}'
     GRAPH_API_ENDPOINT = 'https://graph.microsoft.com/v1.0'
     
+    # Where MSAL's token cache is persisted between requests and restarts
+    TOKEN_CACHE_FILE = os.getenv('MSAL_TOKEN_CACHE_FILE', 'msal_token_cache.json')
+    
+    # A list, not a tuple: MSAL's acquire_token_* methods assert isinstance(scopes, list)
     SCOPES = [
         'User.Read',              # Basic user profile
         'User.ReadBasic.All',     # Read other users' basic profiles
@@ -32,22 +37,26 @@ class MicrosoftConfig:
         'Mail.Read',              # Read emails (optional)
     ]
     
+    # Built once at class creation; read-only so callers can't mutate the shared copy
+    MSAL_CONFIG = MappingProxyType({
+        'client_id': CLIENT_ID,
+        'client_secret': CLIENT_SECRET,
+        'authority': AUTHORITY,
+        'redirect_uri': REDIRECT_URI,
+        'scopes': SCOPES
+    })
+    
+    _REQUIRED = ('CLIENT_ID', 'CLIENT_SECRET', 'TENANT_ID')
+    
     @staticmethod
-    def get_msal_config() -> Dict[str, Any]:
+    def get_msal_config() -> Mapping[str, Any]:
         """Get MSAL configuration for authentication"""
-        return {
-            'client_id': MicrosoftConfig.CLIENT_ID,
-            'client_secret': MicrosoftConfig.CLIENT_SECRET,
-            'authority': MicrosoftConfig.AUTHORITY,
-            'redirect_uri': MicrosoftConfig.REDIRECT_URI,
-            'scopes': MicrosoftConfig.SCOPES
-        }
+        return MicrosoftConfig.MSAL_CONFIG
     
     @staticmethod
     def validate_config() -> bool:
         """Validate that all required configuration is present"""
-        required_vars = ['CLIENT_ID', 'CLIENT_SECRET', 'TENANT_ID']
-        for var in required_vars:
+        for var in MicrosoftConfig._REQUIRED:
             value = getattr(MicrosoftConfig, var)
             if not value or value.startswith('YOUR_'):
                 print(f"❌ Missing or invalid configuration: {var}")
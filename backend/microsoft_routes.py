@@ -1,9 +1,10 @@
-from flask import Flask, request, jsonify, redirect, session
+from flask import Flask, Response, request, jsonify, redirect, session
 from flask_restx import Api, Resource, fields, Namespace
-import msal
-from graph_api_service import GraphAPIService, TokenManager
+from graph_api_service import GraphAPIService, TokenManager, get_msal_app, prewarm_connections
 from microsoft_config import MicrosoftConfig
 from datetime import datetime, timedelta
+import orjson
+import os
 
 teams_ns = Namespace('teams', description='Microsoft Teams operations')
 todo_ns = Namespace('todo', description='Microsoft To Do operations')
@@ -47,7 +48,7 @@ task_model = todo_ns.model('Task', {
     'title': fields.String(description='Task title'),
     'status': fields.String(description='Task status'),
     'importance': fields.String(description='Task importance'),
-    'dueDateTime': fields.String(description='Due date'),
+    'dueDateTime': fields.Raw(description='Due date ({dateTime, timeZone})'),
     'isReminderOn': fields.Boolean(description='Reminder enabled'),
 })
 
@@ -66,11 +67,7 @@ class Login(Resource):
     @auth_ns.marshal_with(auth_response)
     def get(self):
         """Get Microsoft login URL"""
-        msal_app = msal.ConfidentialClientApplication(
-            MicrosoftConfig.CLIENT_ID,
-            authority=MicrosoftConfig.AUTHORITY,
-            client_credential=MicrosoftConfig.CLIENT_SECRET
-        )
+        msal_app = get_msal_app()
         
         auth_url = msal_app.get_authorization_request_url(
             scopes=MicrosoftConfig.SCOPES,
@@ -121,6 +118,11 @@ class RefreshToken(Resource):
         except Exception as e:
             return {'error': str(e)}, 500
 
+def json_response(data, status=200):
+    """Return Graph data that is already in its response shape, encoded once by orjson"""
+    return Response(orjson.dumps(data), status=status, mimetype='application/json')
+
+
 def get_graph_service():
     """Helper to get GraphAPIService from auth token"""
     auth_header = request.headers.get('Authorization')
@@ -147,6 +149,21 @@ class Chats(Resource):
             return {'error': str(e)}, 500
 
 
+@teams_ns.route('/dashboard')
+class TeamsDashboard(Resource):
+    @teams_ns.doc('get_teams_dashboard', security='Bearer')
+    def get(self):
+        """Get chats, teams and To Do lists in one Graph round trip"""
+        graph_service, error, code = get_graph_service()
+        if error:
+            return error, code
+        
+        try:
+            return graph_service.get_dashboard()
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+
 @teams_ns.route('/chats/<string:chat_id>/messages')
 class ChatMessages(Resource):
     @teams_ns.doc('get_chat_messages', security='Bearer')
@@ -167,6 +184,44 @@ class ChatMessages(Resource):
             return {'error': str(e)}, 500
 
 
+@teams_ns.route('/chats/recent')
+class RecentChatMessages(Resource):
+    @teams_ns.doc('get_recent_chat_messages', security='Bearer')
+    @teams_ns.param('chats', 'Number of recent chats to include (default: 5, max: 20)')
+    @teams_ns.param('limit', 'Messages per chat (default: 20)')
+    def get(self):
+        """Get the latest messages across the most recent chats"""
+        graph_service, error, code = get_graph_service()
+        if error:
+            return error, code
+        
+        chat_count = min(request.args.get('chats', 5, type=int), 20)
+        limit = request.args.get('limit', 20, type=int)
+        
+        try:
+            chats = graph_service.get_recent_chat_messages(chat_count, limit)
+            return {'chats': chats}
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+
+@teams_ns.route('/teams/<string:team_id>/presence')
+class TeamPresence(Resource):
+    @teams_ns.doc('get_team_presence', security='Bearer')
+    @teams_ns.param('team_id', 'The team ID')
+    def get(self, team_id):
+        """Get presence for every member of a team"""
+        graph_service, error, code = get_graph_service()
+        if error:
+            return error, code
+        
+        try:
+            members = graph_service.get_team_members_presence(team_id)
+            return {'members': members}
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+
 @teams_ns.route('/chats/send')
 class SendMessage(Resource):
     @teams_ns.doc('send_message', security='Bearer')
@@ -257,7 +312,7 @@ class UserPresence(Resource):
 @todo_ns.route('/lists')
 class TodoLists(Resource):
     @todo_ns.doc('get_todo_lists', security='Bearer')
-    @todo_ns.marshal_list_with(todo_list_model)
+    @todo_ns.response(200, 'Success', [todo_list_model])
     def get(self):
         """Get all To Do lists"""
         graph_service, error, code = get_graph_service()
@@ -265,8 +320,9 @@ class TodoLists(Resource):
             return error, code
         
         try:
+            # get_todo_lists $selects exactly the TodoList fields, so no marshalling pass
             lists = graph_service.get_todo_lists()
-            return lists
+            return json_response(lists)
         except Exception as e:
             return {'error': str(e)}, 500
     
@@ -296,7 +352,7 @@ class TodoLists(Resource):
 class Tasks(Resource):
     @todo_ns.doc('get_tasks', security='Bearer')
     @todo_ns.param('list_id', 'The list ID')
-    @todo_ns.marshal_list_with(task_model)
+    @todo_ns.response(200, 'Success', [task_model])
     def get(self, list_id):
         """Get all tasks from a list"""
         graph_service, error, code = get_graph_service()
@@ -304,8 +360,9 @@ class Tasks(Resource):
             return error, code
         
         try:
+            # get_tasks $selects exactly the Task fields, so no marshalling pass
             tasks = graph_service.get_tasks(list_id)
-            return tasks
+            return json_response(tasks)
         except Exception as e:
             return {'error': str(e)}, 500
     
@@ -382,8 +439,42 @@ class CompleteTask(Resource):
         except Exception as e:
             return {'error': str(e)}, 500
 
+
+@todo_ns.route('/lists/<string:list_id>/tasks/bulk_complete')
+class BulkCompleteTasks(Resource):
+    @todo_ns.doc('bulk_complete_tasks', security='Bearer')
+    @todo_ns.param('list_id', 'The list ID')
+    @todo_ns.expect(todo_ns.model('BulkCompleteInput', {
+        'task_ids': fields.List(fields.String, required=True, description='IDs of tasks to mark complete')
+    }))
+    def post(self, list_id):
+        """Mark several tasks as complete in one Graph round trip per 20 tasks"""
+        graph_service, error, code = get_graph_service()
+        if error:
+            return error, code
+        
+        task_ids = (request.json or {}).get('task_ids')
+        
+        if not task_ids or not isinstance(task_ids, list):
+            return {'error': 'task_ids must be a non-empty list'}, 400
+        
+        try:
+            results = graph_service.bulk_update_tasks(
+                list_id, [(task_id, {'status': 'completed'}) for task_id in task_ids]
+            )
+            return {
+                'results': results,
+                'completed': sum(1 for r in results if r['status'] < 400)
+            }
+        except Exception as e:
+            return {'error': str(e)}, 500
+
 def register_microsoft_routes(api):
     """Register all Microsoft-related routes to the API"""
     api.add_namespace(auth_ns, path='/api/auth')
     api.add_namespace(teams_ns, path='/api/teams')
     api.add_namespace(todo_ns, path='/api/todo')
+    
+    # Only worth it when the Microsoft integration is configured; GRAPH_PREWARM=0 opts out
+    if os.getenv('GRAPH_PREWARM', '1') == '1' and not MicrosoftConfig.CLIENT_ID.startswith('YOUR_'):
+        prewarm_connections()
@@ -0,0 +1,23 @@
+"""
+Shared HTTP connection pool for every OpenAI client in the backend
+Chat, notes and study-plan calls reuse the same warm TLS connections instead
+of each client keeping its own pool
+"""
+
+import os
+import httpx
+from openai import DefaultHttpxClient
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 200))
+OPENAI_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_KEEPALIVE_CONNECTIONS", 100))
+# httpx drops idle connections after 5s, so every pause between bursts cost
+# fresh TCP+TLS handshakes
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 60))
+
+http_client = DefaultHttpxClient(
+    limits=httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    ),
+)
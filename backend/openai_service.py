@@ -1,10 +1,64 @@
 import os
-import json
-import re
-from typing import Any, Optional
+import base64
+import hashlib
+import math
+import orjson
+import tiktoken
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, Optional
 from openai import OpenAI
+from openai_http import http_client
+from PIL import Image, ImageOps
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+
+# Caps in-flight OpenAI calls per process; request threads beyond it wait their
+# turn instead of all hitting the rate limit at once
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", 32))
+_openai_slots = threading.BoundedSemaphore(OPENAI_CONCURRENCY)
+
+
+def _complete(**kwargs):
+    """client.chat.completions.create, limited to OPENAI_CONCURRENCY calls at a time"""
+    with _openai_slots:
+        return client.chat.completions.create(**kwargs)
+
+
+# Replies for identical requests (retried frontend actions, re-uploaded syllabi),
+# keyed by a SHA-256 of the inputs; least recently used first
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL = 24 * 60 * 60
+_response_cache: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+
+def _cache_key(*parts: Any) -> str:
+    return hashlib.sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _cached_reply(key: str, produce, nocache: bool = False) -> str:
+    """Return the cached reply for key, or call produce() and cache its result."""
+    if not nocache:
+        with _response_cache_lock:
+            entry = _response_cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                _response_cache.move_to_end(key)
+                return entry[1]
+    
+    reply = produce()
+    
+    with _response_cache_lock:
+        _response_cache[key] = (time.monotonic() + RESPONSE_CACHE_TTL, reply)
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+    return reply
 
 SYSTEM_PROMPT = """You are StudyBot, an AI study planner for university students.
 
@@ -42,61 +96,235 @@ Would you like me to adjust anything?"
 """
 
 
-def chat(messages: list[dict[str, str]]) -> str:
+# Chat replies can carry a whole fenced study plan, so this stays roomy
+CHAT_MAX_TOKENS = int(os.getenv("CHAT_MAX_TOKENS", 2000))
+
+# gpt-4o's context window; prompts are trimmed or rejected locally rather than
+# spending a round-trip on a 400
+CONTEXT_WINDOW_TOKENS = 128000
+# Per-message framing tokens the chat format adds around each content string
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# tiktoken downloads the BPE file on first use and caches it here; a directory
+# next to the app survives restarts, unlike the default under the temp dir
+os.environ.setdefault(
+    "TIKTOKEN_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tiktoken_cache")
+)
+# Seconds before a failed tokenizer load is tried again
+ENCODING_RETRY_SECONDS = 300
+
+_encoding = None
+_encoding_loading = False
+_encoding_failed_at = None
+_encoding_lock = threading.Lock()
+
+
+def _load_encoding():
+    global _encoding, _encoding_loading, _encoding_failed_at
+    try:
+        encoding = tiktoken.encoding_for_model("gpt-4o")
+    except Exception:
+        encoding = None
+    with _encoding_lock:
+        _encoding = encoding
+        _encoding_failed_at = None if encoding else time.monotonic()
+        _encoding_loading = False
+
+
+def _get_encoding():
     """
-    Send messages to GPT-4 and return the assistant's reply.
+    gpt-4o's tokenizer, or None while it is still loading or couldn't be fetched.
+    The load (which may download the BPE file) runs on a background thread so no
+    request waits on it; a failed load is retried after ENCODING_RETRY_SECONDS.
     """
-    response = client.chat.completions.create(
-        model="gpt-4o",  # Use GPT-4 Turbo with vision
-        messages=messages,
-        temperature=0.7,
-        max_tokens=2000,
-    )
-    return response.choices[0].message.content or ""
+    global _encoding_loading
+    if _encoding is not None:
+        return _encoding
+    with _encoding_lock:
+        retry_due = (
+            _encoding_failed_at is None
+            or time.monotonic() - _encoding_failed_at >= ENCODING_RETRY_SECONDS
+        )
+        if _encoding is None and not _encoding_loading and retry_due:
+            _encoding_loading = True
+            threading.Thread(target=_load_encoding, name="tiktoken-load", daemon=True).start()
+    return _encoding
+
 
+def count_tokens(messages: list[dict[str, Any]]) -> int:
+    """Prompt tokens for messages' text content (about 4 characters a token without tiktoken)."""
+    enc = _get_encoding()
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += MESSAGE_OVERHEAD_TOKENS + (len(enc.encode(content)) if enc else len(content) // 4)
+    return total
 
 
-def parse_uploaded_files(file_data_list: list[dict[str, Any]]) -> str:
+# Start loading the tokenizer at import so it is usually ready by the first request
+_get_encoding()
+
+
+def _fit_context(messages: list[dict[str, str]], budget: int) -> list[dict[str, str]]:
     """
-    Parse uploaded files (images/PDFs as base64) using GPT-4 Vision.
-    
-    Args:
-        file_data_list: List of dicts with {type: "image" or "pdf", base64: "...", filename: "..."}
-    
-    Returns:
-        Extracted text describing modules, deadlines, topics
+    Drop the oldest user/assistant messages until the conversation fits budget.
+    System messages and the latest message are always kept.
     """
-    if not file_data_list:
-        return ""
+    costs = [count_tokens([m]) for m in messages]
+    total = sum(costs)
+    if total <= budget:
+        return messages
+    keep = [True] * len(messages)
+    for i, message in enumerate(messages[:-1]):
+        if total <= budget:
+            break
+        if message["role"] != "system":
+            keep[i] = False
+            total -= costs[i]
+    return [m for m, kept in zip(messages, keep) if kept]
+
+
+def chat(messages: list[dict[str, str]], nocache: bool = False) -> str:
+    """
+    Send messages to GPT-4 and return the assistant's reply.
+    An identical conversation gets the cached reply unless nocache is set.
+    Conversations too long for the context window lose their oldest turns first.
+    """
+    messages = _fit_context(messages, CONTEXT_WINDOW_TOKENS - CHAT_MAX_TOKENS)
     
-    content = [
-        {
-            "type": "text",
-            "text": """Extract the following from these course materials:
+    def produce():
+        response = _complete(
+            model="gpt-4o",  # Use GPT-4 Turbo with vision
+            messages=messages,
+            temperature=0.7,
+            max_tokens=CHAT_MAX_TOKENS,
+        )
+        return response.choices[0].message.content or ""
+    
+    return _cached_reply(_cache_key("chat", "gpt-4o", 0.7, messages), produce, nocache)
+
+
+
+PARSE_FILES_PROMPT = """Extract the following from these course materials:
 1. Module/Subject names
 2. Assignment deadlines (with dates)
 3. Key topics/chapters to study
 4. Any exam dates
 
 Format as a clear bullet list."""
-        }
+
+# Most images parsed at once for one upload; _complete's cap still applies across requests
+PARSE_FILES_WORKERS = int(os.getenv("PARSE_FILES_WORKERS", 8))
+
+
+def chat_stream(messages: list[dict[str, str]]) -> Iterator[str]:
+    """
+    Streaming variant of chat(): yields pieces of the assistant's reply as they
+    are generated. The concurrency slot is held until the stream is exhausted or closed.
+    """
+    messages = _fit_context(messages, CONTEXT_WINDOW_TOKENS - CHAT_MAX_TOKENS)
+    with _openai_slots:
+        stream = client.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=CHAT_MAX_TOKENS,
+            stream=True,
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+
+# Vision downsizes larger images anyway; sending them pre-shrunk saves upload bytes
+VISION_MAX_EDGE = 1568
+VISION_JPEG_QUALITY = 75
+
+
+def _shrink_image(image_b64: str) -> str:
+    """Downscale and recompress a base64 image to a base64 JPEG no larger than Vision uses.
+    Anything that isn't a decodable image, or wouldn't get smaller, is returned unchanged."""
+    try:
+        img = Image.open(BytesIO(base64.b64decode(image_b64)))
+        if img.format == "JPEG" and max(img.size) <= VISION_MAX_EDGE:
+            return image_b64
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((VISION_MAX_EDGE, VISION_MAX_EDGE))
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            # Flatten onto white so transparent areas don't turn black
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, "white")
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        buf = BytesIO()
+        img.save(buf, "JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return image_b64
+    
+    shrunk = base64.b64encode(buf.getvalue()).decode("ascii")
+    return shrunk if len(shrunk) < len(image_b64) else image_b64
+
+
+def _parse_image(file_data: dict[str, Any], nocache: bool = False) -> str:
+    """Run one image through GPT-4 Vision and return its bullet list (cached by image content)."""
+    key = _cache_key("parse", "gpt-4o", hashlib.sha256(file_data['base64'].encode()).hexdigest())
+    return _cached_reply(key, lambda: _parse_image_uncached(file_data), nocache)
+
+
+def _parse_image_uncached(file_data: dict[str, Any]) -> str:
+    messages = [
+        {"role": "system", "content": "You are a document parser. Extract course info from uploaded images."},
+        {"role": "user", "content": [
+            {"type": "text", "text": PARSE_FILES_PROMPT},
+            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{_shrink_image(file_data['base64'])}"}},
+        ]}
     ]
     
-    for file_data in file_data_list:
-        if file_data["type"] == "image":
-            content.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{file_data['base64']}"
-                }
-            })
+    response = _complete(
+        model="gpt-4o",
+        messages=messages,
+        max_tokens=1500,
+    )
     
+    return response.choices[0].message.content or ""
+
+
+# ~15k tokens of extracted text is plenty for a syllabus or schedule
+PDF_TEXT_MAX_CHARS = 60000
+
+
+def _pdf_text(pdf_b64: str) -> str:
+    """Text layer of a base64 PDF; empty for scanned or unreadable files."""
+    try:
+        reader = PdfReader(BytesIO(base64.b64decode(pdf_b64)))
+        text = "\n".join(page.extract_text() or "" for page in reader.pages)
+    except (PyPdfError, ValueError, OSError):
+        return ""
+    return text.strip()[:PDF_TEXT_MAX_CHARS]
+
+
+def _parse_pdf(file_data: dict[str, Any], nocache: bool = False) -> str:
+    """Extract a PDF's text locally and send it as plain text (cached by PDF content).
+    PDFs without a text layer are skipped rather than sent for a guess."""
+    text = _pdf_text(file_data['base64'])
+    if not text:
+        return ""
+    key = _cache_key("parse-pdf", "gpt-4o", hashlib.sha256(file_data['base64'].encode()).hexdigest())
+    return _cached_reply(key, lambda: _parse_pdf_text(text), nocache)
+
+
+def _parse_pdf_text(text: str) -> str:
     messages = [
-        {"role": "system", "content": "You are a document parser. Extract course info from uploaded images."},
-        {"role": "user", "content": content}
+        {"role": "system", "content": "You are a document parser. Extract course info from uploaded documents."},
+        {"role": "user", "content": f"{PARSE_FILES_PROMPT}\n\n{text}"}
     ]
     
-    response = client.chat.completions.create(
+    response = _complete(
         model="gpt-4o",
         messages=messages,
         max_tokens=1500,
@@ -105,6 +333,140 @@ Format as a clear bullet list."""
     return response.choices[0].message.content or ""
 
 
+_FILE_PARSERS = {"image": _parse_image, "pdf": _parse_pdf}
+
+
+def parse_uploaded_files(file_data_list: list[dict[str, Any]], nocache: bool = False) -> str:
+    """
+    Parse uploaded files (images/PDFs as base64) using GPT-4o.
+    
+    Each file gets its own request, run concurrently, so a long syllabus is
+    neither serialized through one call nor squeezed into one token budget.
+    Images go through Vision; PDFs have their text extracted locally and are
+    sent as plain text.
+    
+    Args:
+        file_data_list: List of dicts with {type: "image" or "pdf", base64: "...", filename: "..."}
+        nocache: Re-parse every file even if the same content was parsed recently
+    
+    Returns:
+        Extracted text describing modules, deadlines, topics
+    """
+    files = [f for f in (file_data_list or []) if f["type"] in _FILE_PARSERS]
+    if not files:
+        return ""
+    
+    def parse(file_data):
+        return _FILE_PARSERS[file_data["type"]](file_data, nocache)
+    
+    if len(files) == 1:
+        return parse(files[0])
+    
+    with ThreadPoolExecutor(max_workers=min(PARSE_FILES_WORKERS, len(files))) as executor:
+        results = list(executor.map(parse, files))
+    
+    return "\n\n".join(
+        f"### {file_data.get('filename') or f'File {i}'}\n{text}"
+        for i, (file_data, text) in enumerate(zip(files, results), start=1)
+        if text
+    )
+
+
+def _compact_json(value: Any) -> str:
+    """Compact JSON with no whitespace between separators (fewer prompt tokens)."""
+    return orjson.dumps(value).decode()
+
+
+def _strict_object(properties: dict) -> dict:
+    """Object schema in the form strict structured outputs require: all keys, nothing else."""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+# Shape of the generated part of a study plan (inputs are filled in from the request)
+STUDY_PLAN_SCHEMA = _strict_object({
+    "metadata": _strict_object({
+        "timezone": {"type": "string"},
+        "generatedAt": {"type": "string"},
+        "weekStart": {"type": "string"},
+    }),
+    "plan": {
+        "type": "array",
+        "items": _strict_object({
+            "title": {"type": "string"},
+            "type": {"type": "string", "enum": ["study", "break"]},
+            "moduleId": {"type": ["string", "null"]},
+            "start": {"type": "string"},
+            "end": {"type": "string"},
+            "resources": {
+                "type": "array",
+                "items": _strict_object({
+                    "label": {"type": "string"},
+                    "url": {"type": "string"},
+                }),
+            },
+        }),
+    },
+    "summary": _strict_object({
+        "totalStudyMinutes": {"type": "integer"},
+        "totalBreakMinutes": {"type": "integer"},
+    }),
+})
+
+
+PLAN_SYSTEM_PROMPT = """You are a study plan generator. Generate a two-week study plan from the
+modules, deadlines, preferences and timezone the user gives you.
+
+metadata.generatedAt is the current ISO8601 timestamp and metadata.weekStart the
+ISO8601 date of next Monday. Plan entries look like:
+{"title": "CS101 - Read Module 2 Notes", "type": "study", "moduleId": "CS101",
+  "start": "2026-02-02T18:00:00+04:00", "end": "2026-02-02T18:50:00+04:00",
+  "resources": [{"label": "Module 2 Slides", "url": "https://..."}]}
+{"title": "Break", "type": "break", "moduleId": null,
+  "start": "2026-02-02T18:50:00+04:00", "end": "2026-02-02T19:00:00+04:00", "resources": []}
+
+Rules:
+1. Schedule study sessions ONLY on the days in studyDays
+2. All sessions between dailyStart and dailyEnd
+3. Insert breaks according to breakRule (e.g., 10min break every 50min)
+4. Prioritize modules with nearest deadlines
+5. Include "resources" array for each study session (even if empty)
+6. Plan for the next 2 weeks
+7. Use the UTC offset of the given timezone (e.g. +04:00 for Asia/Dubai)"""
+
+
+# Rough output size of one plan entry and of the metadata/summary around them
+PLAN_ENTRY_TOKENS = 70
+PLAN_OVERHEAD_TOKENS = 200
+PLAN_MIN_TOKENS = 1000
+PLAN_MAX_TOKENS = 16000  # just under gpt-4o's output limit
+
+
+def _plan_max_tokens(preferences: dict) -> int:
+    """
+    max_tokens sized to the plan the preferences imply: two weeks of study days,
+    each window split into study + break blocks. Falls back to the old fixed
+    3000 when the preferences can't be read.
+    """
+    try:
+        days = len(preferences.get("studyDays") or []) or 7
+        start_h, start_m = map(int, preferences["dailyStart"].split(":"))
+        end_h, end_m = map(int, preferences["dailyEnd"].split(":"))
+        window = max((end_h * 60 + end_m) - (start_h * 60 + start_m), 0)
+        rule = preferences.get("breakRule") or {}
+        block = (rule.get("everyMinutes") or 50) + (rule.get("breakMinutes") or 10)
+        entries = 2 * days * 2 * math.ceil(window / block)
+    except (KeyError, ValueError, TypeError, AttributeError, ZeroDivisionError):
+        return 3000
+    # 20% headroom so a slightly chattier plan isn't cut off mid-JSON
+    estimate = int((PLAN_OVERHEAD_TOKENS + entries * PLAN_ENTRY_TOKENS) * 1.2)
+    return min(max(estimate, PLAN_MIN_TOKENS), PLAN_MAX_TOKENS)
+
+
 def generate_study_plan_json(
     modules: list[dict],
     deadlines: list[dict],
@@ -129,78 +491,95 @@ def generate_study_plan_json(
     Returns:
         Full study plan JSON matching your schema
     """
-    prompt = f"""Generate a study plan JSON with this EXACT structure:
-
-{{
-  "metadata": {{
-    "timezone": "{timezone}",
-    "generatedAt": "<ISO8601 timestamp>",
-    "weekStart": "<ISO8601 date of next Monday>"
-  }},
-  "inputs": {{
-    "modules": {json.dumps(modules)},
-    "deadlines": {json.dumps(deadlines)},
-    "preferences": {json.dumps(preferences)}
-  }},
-  "plan": [
-    {{
-      "title": "CS101 - Read Module 2 Notes",
-      "type": "study",
-      "moduleId": "CS101",
-      "start": "2026-02-02T18:00:00+04:00",
-      "end": "2026-02-02T18:50:00+04:00",
-      "resources": [
-        {{"label": "Module 2 Slides", "url": "https://..."}}
-      ]
-    }},
-    {{
-      "title": "Break",
-      "type": "break",
-      "start": "2026-02-02T18:50:00+04:00",
-      "end": "2026-02-02T19:00:00+04:00"
-    }}
-  ],
-  "summary": {{"totalStudyMinutes": 240, "totalBreakMinutes": 40}}
-}}
-
-Rules:
-1. Schedule study sessions ONLY on the days in studyDays
-2. All sessions between dailyStart and dailyEnd
-3. Insert breaks according to breakRule (e.g., 10min break every 50min)
-4. Prioritize modules with nearest deadlines
-5. Include "resources" array for each study session (even if empty)
-6. Plan for the next 2 weeks
-7. Use the timezone offset (+04:00 for Dubai)
-
-Output ONLY the JSON, no explanation."""
+    # Only the per-request data goes in the user message; the system prompt stays
+    # byte-identical across calls so OpenAI can serve it from the prompt cache
+    prompt = f"""Modules: {_compact_json(modules)}
+Deadlines: {_compact_json(deadlines)}
+Preferences: {_compact_json(preferences)}
+Timezone: {timezone}"""
 
     messages = [
-        {"role": "system", "content": "You are a study plan generator. Output valid JSON only."},
+        {"role": "system", "content": PLAN_SYSTEM_PROMPT},
         {"role": "user", "content": prompt}
     ]
     
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        temperature=0.3,
-        max_tokens=3000,
-    )
+    max_tokens = _plan_max_tokens(preferences)
+    if count_tokens(messages) + max_tokens > CONTEXT_WINDOW_TOKENS:
+        raise ValueError("Too many modules or deadlines to plan in one request")
     
-    reply = response.choices[0].message.content or "{}"
+    # Deterministic decoding: the same inputs give the same plan, so it can be cached
+    def produce():
+        # The schema constrains decoding, so the reply is bare JSON with no fences to strip
+        response = _complete(
+            model="gpt-4o",
+            messages=messages,
+            temperature=0,
+            seed=int(hashlib.sha1(prompt.encode()).hexdigest()[:8], 16),
+            max_tokens=max_tokens,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": "study_plan", "schema": STUDY_PLAN_SCHEMA, "strict": True},
+            },
+        )
+        content = response.choices[0].message.content or ""
+        # Validate before it is cached, so a bad reply is retried next time
+        orjson.loads(content)
+        return content
     
-    json_match = re.search(r'```json\s*(.*?)\s*```', reply, re.DOTALL)
-    if json_match:
-        reply = json_match.group(1)
+    inputs = {"modules": modules, "deadlines": deadlines, "preferences": preferences}
     
+    # Still possible: a refusal (no content) or a reply cut off at max_tokens
     try:
-        return json.loads(reply)
-    except json.JSONDecodeError:
+        generated = orjson.loads(_cached_reply(_cache_key("plan", "gpt-4o", prompt), produce))
+    except orjson.JSONDecodeError:
         return {
             "metadata": {"timezone": timezone, "generatedAt": "", "weekStart": ""},
-            "inputs": {"modules": modules, "deadlines": deadlines, "preferences": preferences},
+            "inputs": inputs,
             "plan": [],
             "summary": {"totalStudyMinutes": 0, "totalBreakMinutes": 0}
         }
+    
+    # inputs are echoed from the request rather than generated, saving output tokens
+    return {
+        "metadata": generated["metadata"],
+        "inputs": inputs,
+        "plan": generated["plan"],
+        "summary": generated["summary"],
+    }
+
+
+PLAN_BATCH_WORKERS = int(os.getenv("PLAN_BATCH_WORKERS", 16))
+
+
+def generate_study_plans(requests: list[dict]) -> list[dict]:
+    """
+    Generate many study plans concurrently (e.g. regenerating a whole cohort).
+
+    Args:
+        requests: [{"modules": [...], "deadlines": [...], "preferences": {...}, "timezone": "..."}, ...]
+            with the same shapes as generate_study_plan_json's arguments
+
+    Returns:
+        One plan per request, in order; a request that failed gets {"error": "..."}
+        so one bad input doesn't lose the rest of the batch
+    """
+    if not requests:
+        return []
+
+    def generate(request):
+        try:
+            return generate_study_plan_json(
+                request.get("modules", []),
+                request.get("deadlines", []),
+                request.get("preferences", {}),
+                request.get("timezone", "Asia/Dubai"),
+            )
+        except Exception as e:
+            return {"error": str(e)}
+
+    # Overall OpenAI concurrency is still capped by _complete's semaphore
+    with ThreadPoolExecutor(max_workers=min(PLAN_BATCH_WORKERS, len(requests))) as executor:
+        return list(executor.map(generate, requests))
 
 
 def build_context_message(assignments: list[dict], existing_plan: Optional[dict] = None) -> str:
@@ -208,14 +587,18 @@ def build_context_message(assignments: list[dict], existing_plan: Optional[dict]
     if not assignments:
         return "The student hasn't uploaded any assignments yet."
     
-    context = "Student's current assignments:\n"
-    for a in assignments[:10]:  # Limit to 10 for brevity
-        context += f"- {a.get('name', 'Untitled')} (due: {a.get('due_date', 'unknown')})\n"
+    parts = ["Student's current assignments:"]
+    parts.extend(
+        f"- {a.get('name', 'Untitled')} (due: {a.get('due_date', 'unknown')})"
+        for a in assignments[:10]  # Limit to 10 for brevity
+    )
+    # Trailing "" keeps the newline after the last assignment
+    parts.append("")
     
     if existing_plan:
-        context += f"\nExisting plan: {json.dumps(existing_plan, indent=2)[:500]}..."
+        parts.append(f"Existing plan: {orjson.dumps(existing_plan, option=orjson.OPT_INDENT_2).decode()[:500]}...")
     
-    return context
+    return "\n".join(parts)
 
 
 def extract_json_plan(assistant_reply: str) -> Optional[dict]:
@@ -223,15 +606,20 @@ def extract_json_plan(assistant_reply: str) -> Optional[dict]:
     Extract JSON study plan from assistant's message if present.
     Returns None if no valid JSON found.
     """
-    json_match = re.search(r'```json\s*(.*?)\s*```', assistant_reply, re.DOTALL)
-    
-    if json_match:
-        try:
-            return json.loads(json_match.group(1))
-        except json.JSONDecodeError:
-            pass
+    # Text between the first ```json fence and the closing ``` after it
+    _, fence, rest = assistant_reply.partition("```json")
+    if fence:
+        json_str, closed, _ = rest.partition("```")
+        if closed:
+            try:
+                return orjson.loads(json_str)
+            except orjson.JSONDecodeError:
+                pass
     
+    # A bare JSON reply must start with an object; don't pay for a failed parse otherwise
+    if not assistant_reply.lstrip().startswith("{"):
+        return None
     try:
-        return json.loads(assistant_reply)
-    except json.JSONDecodeError:
+        return orjson.loads(assistant_reply)
+    except orjson.JSONDecodeError:
         return None
\ No newline at end of file
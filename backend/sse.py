@@ -0,0 +1,21 @@
+"""
+Server-Sent Events helpers shared by the streaming chat endpoints
+"""
+
+import orjson
+from flask import Response, stream_with_context
+
+
+def sse_event(payload):
+    """Format a payload as one Server-Sent Events message"""
+    return b'data: ' + orjson.dumps(payload) + b'\n\n'
+
+
+def sse_response(events):
+    """Stream an iterable of sse_event() messages as a text/event-stream response"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        # Stop nginx from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
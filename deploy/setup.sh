@@ -64,7 +64,7 @@ deactivate
 # ─── 6. Configure Gunicorn service ─────────────────────────
 echo "[6/7] Configuring Gunicorn & Nginx..."
 
-# Gunicorn systemd service
+# Gunicorn systemd service (worker/thread settings live in backend/gunicorn_conf.py)
 sudo tee /etc/systemd/system/myapp.service > /dev/null <<EOF
 [Unit]
 Description=Flask App via Gunicorn
@@ -75,7 +75,7 @@ User=$USER
 Group=$(id -gn)
 WorkingDirectory=$APP_DIR/backend
 Environment="PATH=$VENV_DIR/bin:/usr/bin:/bin"
-ExecStart=$VENV_DIR/bin/gunicorn --workers 2 --bind 127.0.0.1:5000 app:app
+ExecStart=$VENV_DIR/bin/gunicorn -c gunicorn_conf.py app:app
 Restart=always
 RestartSec=5
 